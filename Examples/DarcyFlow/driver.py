@@ -9,8 +9,9 @@ A. N. Hirani, K. B. Nakshatrala, J. H. Chaudhry
 See arXiv:0810.3434v3 [math.NA] on http://arxiv.org/abs/0810.3434
 
 """
-from numpy import zeros, sort, asarray, loadtxt, array, dot, \
-     concatenate, sign, vstack, argmax, nonzero
+from numpy import zeros, asarray, loadtxt, array, dot, \
+     concatenate, sign, vstack, argmax, nonzero, arange, setdiff1d, \
+     column_stack, stack
 from numpy.linalg import norm, det
 from scipy.sparse import bmat
 from scipy.sparse.linalg import spsolve
@@ -21,8 +22,8 @@ velocity = array([1.,0])
 # Read the mesh
 vertices = loadtxt('vertices.txt')
 triangles = loadtxt('triangles.txt', dtype='int') - 1
-# Make a simplicial complex from it
-sc = simplicial_complex((vertices,triangles))
+# Make a simplicial complex from it, only edges and triangles are needed
+sc = simplicial_complex((vertices,triangles), dimensions=[1,2])
 # Nk is number of k-simplices
 N1 = sc[1].num_simplices
 N2 = sc[2].num_simplices
@@ -43,22 +44,18 @@ A = bmat([[(-mu/k)*sc[1].star, sc[1].d.T],
 b = zeros(N1 + N2) # RHS vector
 all_fluxes = zeros(N1)
 # Find boundary and internal edges
-boundary_edges = sc.boundary(); boundary_edges.sort()
-boundary_indices = list(sort([sc[1].simplex_to_index[e] 
-                                       for e in boundary_edges]))
+boundary_indices = sc.boundary_faces()[0]
 num_boundary_edges = len(boundary_indices)
-internal_edges = set(sc[1].simplex_to_index.keys()) - set(boundary_edges)
-internal_indices = list(sort([sc[1].simplex_to_index[e] 
-                                       for e in internal_edges]))
+internal_indices = list(setdiff1d(arange(N1), boundary_indices))
 num_internal_edges = sc[1].num_simplices - num_boundary_edges
 # Assume triangles oriented the same way so can look at any triangle
 s = sign(det(vertices[triangles[0,1:]] - vertices[triangles[0,0]]))
-for i, e in enumerate(boundary_edges):
-    evector = (-1)**e.parity * (vertices[e[1]] - vertices[e[0]])
-    normal = array([-evector[1], evector[0]])
-    all_fluxes[boundary_indices[i]] = -s * (1/norm(evector)**2) * \
-                              dot(velocity, normal) * \
-                              abs(det(vstack((normal, evector))))
+boundary_edges = sc[1].simplices[boundary_indices]
+evectors = vertices[boundary_edges[:,1]] - vertices[boundary_edges[:,0]]
+normals = column_stack((-evectors[:,1], evectors[:,0]))
+all_fluxes[boundary_indices] = -s * (1/norm(evectors, axis=1)**2) * \
+                          dot(normals, velocity) * \
+                          abs(det(stack((normals, evectors), axis=1)))
 pressures = zeros(N2)
 # Adjust RHS for known fluxes and pressures
 b = b - A * concatenate((all_fluxes,pressures))
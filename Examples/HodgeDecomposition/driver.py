@@ -32,15 +32,19 @@ def hodge_decomposition(omega):
     alpha = sc.get_cochain(p - 1)
     beta  = sc.get_cochain(p + 1)    
 
+    # assembled operators are cached by the complex, so repeated
+    # decompositions on the same mesh reuse them
+    operators = sc.operator_cache
+
     # Solve for alpha
-    A = delta(d(sc.get_cochain_basis(p - 1))).v
+    A = operators.get('laplace_beltrami', p - 1)
     b = delta(omega).v
     #alpha.v = cg( A, b, tol=1e-8 )[0]
     alpha.v = cg( A, b, rtol=1e-8 )[0]
     # TODO: check if rtol should be more or less stringent
     
     # Solve for beta
-    A = d(delta(sc.get_cochain_basis(p + 1))).v
+    A = operators.get('d', p) * operators.get('delta', p + 1)
     b = d(omega).v
     #beta.v = cg( A, b, tol=1e-8 )[0]
     beta.v = cg( A, b, rtol=1e-8 )[0]
@@ -0,0 +1,49 @@
+"""
+Compare the CSR boundary operators with the fixed-width incidence tables.
+
+Every k-simplex has k+1 faces, so the boundary operator of each level can
+also be stored as a dense table of face indices and signs.  This script
+times the exterior derivative d (a gather over the table) and the boundary
+operator (a scatter-add over the table) against the corresponding sparse
+matrix products on the Delaunay triangulation of random points.
+
+The table kernels are used by d(.) after set_incidence_kernels(True).
+
+"""
+from time import perf_counter
+from numpy.random import seed, rand
+from scipy.spatial import Delaunay
+from pydec import simplicial_complex, incidence_gather, incidence_scatter
+
+def best_time(f, repeat=10):
+    times = []
+    for i in range(repeat):
+        start = perf_counter()
+        f()
+        times.append(perf_counter() - start)
+    return 1000 * min(times)
+
+seed(0) # make results consistent
+
+num_points = 20000
+
+vertices = rand(num_points,3)
+sc = simplicial_complex((vertices,Delaunay(vertices).simplices))
+
+print('%d vertices, times in milliseconds' % num_points)
+print('  k    N_k        d (CSR)  d (table)  boundary (CSR)  boundary (table)')
+
+for k in range(1, sc.complex_dimension() + 1):
+    B = sc[k].boundary.astype(float)
+    D = sc[k - 1].d.astype(float).tocsr()
+    faces,signs = sc[k].face_indices,sc[k].face_signs.astype(float)
+
+    x = rand(B.shape[0])
+    y = rand(B.shape[1])
+
+    print('%3d %8d %12.2f %10.2f %15.2f %17.2f' % \
+            (k, sc[k].num_simplices,
+             best_time(lambda: D * x),
+             best_time(lambda: incidence_gather(faces, signs, x)),
+             best_time(lambda: B * y),
+             best_time(lambda: incidence_scatter(faces, signs, y, B.shape[0]))))
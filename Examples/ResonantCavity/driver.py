@@ -10,8 +10,8 @@ References:
 
 """
 from pydec import simplicial_complex, d, delta, whitney_innerproduct, \
-     simplex_quivers
-from numpy import loadtxt, real, zeros
+     whitney_stiffness, simplex_quivers
+from numpy import loadtxt, real, zeros, arange, setdiff1d
 from scipy.linalg import eig
 from matplotlib.pylab import quiver, figure, triplot, show
 
@@ -20,14 +20,13 @@ vertices = loadtxt('vertices.txt', dtype=float)
 triangles = loadtxt('triangles.txt', dtype=int)
 sc = simplicial_complex((vertices,triangles))
 
-# Construct stiffness and mass matrices 
-K = sc[1].d.T * whitney_innerproduct(sc,2) * sc[1].d
+# Construct stiffness and mass matrices, which share one sparsity pattern
+K = whitney_stiffness(sc,1)
 M = whitney_innerproduct(sc,1)
 
 # Eliminate Boundaries from matrices
-boundary_edges = sc.boundary()
-non_boundary_edges = set(sc[1].simplex_to_index.keys()) - set(boundary_edges)
-non_boundary_indices = [sc[1].simplex_to_index[e] for e in non_boundary_edges]
+boundary_indices = sc.boundary_faces()[0]
+non_boundary_indices = setdiff1d(arange(sc[1].num_simplices), boundary_indices)
 
 # Eliminate boundary conditions
 K = K[non_boundary_indices,:][:,non_boundary_indices]
@@ -5,6 +5,8 @@ from .info import __doc__
 from .rips_complex import *
 from .cochain import *
 from .simplicial_complex import *
+from .incidence import *
+from .operator_cache import *
 from .regular_cube_complex import *
 from .abstract_simplicial_complex import *
 
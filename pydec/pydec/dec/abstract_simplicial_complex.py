@@ -1,8 +1,8 @@
-from numpy import zeros, ones, arange, array, asarray, hstack, vstack, empty, lexsort, atleast_2d
-from numpy import all as alltrue #temporary fix. Change above to np.*
+from numpy import zeros, ones, arange, asarray, vstack, empty, unique, atleast_2d
 from scipy import sparse
 
-from .simplex_array import simplex_array_parity, simplex_array_boundary, simplex_array_searchsorted
+from .simplex_array import simplex_array_parity, simplex_array_boundary, simplex_array_searchsorted, \
+        simplex_key
 
 __all__ = ['abstract_simplicial_complex']
 
@@ -68,12 +68,9 @@ class abstract_simplicial_complex:
                 # merge user-defined faces with boundary faces
                 s = vstack((s,simplices[d]))
                 
-                # sort rows to bring equivalent elements together
-                s = s[lexsort(s.T[::-1])]
-
-                # find unique simplices
-                mask = ~hstack((array([False]),alltrue(s[1:] == s[:-1],axis=1)))
-                s = s[mask]
+                # find unique simplices in lexicographical order
+                first = unique(simplex_key(s), return_index=True)[1]
+                s = s[first]
 
                 # indices of the boundary faces in the full face array
                 remap = simplex_array_searchsorted(s, old_s)
@@ -1,7 +1,81 @@
-__all__ = ['cochain','Cochain','d','star','delta','laplace_beltrami','laplace_derham']
+__all__ = ['cochain','Cochain','cochain_block','d','star','delta','laplace_beltrami','laplace_derham',
+           'set_num_threads','get_num_threads','set_incidence_kernels','get_incidence_kernels']
 
+from concurrent.futures import ThreadPoolExecutor
+
+from numpy import multiply, ndim, ascontiguousarray, ndarray, result_type, \
+        may_share_memory, empty
 from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, aslinearoperator
+try:
+    # kernels which write sparse products into preallocated arrays
+    from scipy.sparse import _sparsetools
+except ImportError:
+    _sparsetools = None
 from pydec.mesh import Simplex
+from .incidence import incidence_gather, incidence_scatter
+
+# thread pool used to apply operators to dense values, see set_num_threads()
+_threads = {'num_threads' : 1, 'executor' : None}
+
+# smallest amount of work (nonzeros times columns) which is split between threads
+_parallel_threshold = 2**16
+
+def set_num_threads(num_threads):
+    """Set the number of threads used to apply operators to dense cochains
+
+    Products of boundary, d and Hodge star operators with dense values
+    are split into blocks of rows that are processed by a pool of 
+    threads, since the underlying kernels release the GIL.  Each row is 
+    computed exactly as in the serial case, so the results do not depend
+    on the number of threads.  The default is a single thread.
+    """
+    num_threads = int(num_threads)
+    if num_threads < 1:
+        raise ValueError('invalid number of threads (%d)' % num_threads)
+
+    if _threads['executor'] is not None:
+        _threads['executor'].shutdown()
+
+    _threads['num_threads'] = num_threads
+    if num_threads == 1:
+        _threads['executor'] = None
+    else:
+        _threads['executor'] = ThreadPoolExecutor(num_threads)
+
+def get_num_threads():
+    """Number of threads used to apply operators to dense cochains"""
+    return _threads['num_threads']
+
+# whether d(.) applies the incidence tables of the complex, see set_incidence_kernels()
+_incidence = {'enabled' : False}
+
+def set_incidence_kernels(enabled):
+    """Choose how d(.) is applied to dense floating point cochains
+
+    By default the boundary operators are applied as CSR matrices.  When
+    enabled, d(.) instead gathers (for primal cochains) or scatter-adds 
+    (for dual cochains) over the fixed-width incidence tables 
+    face_indices and face_signs of each level.  This avoids scipy.sparse
+    entirely, but with NumPy kernels it is several times slower than the
+    CSR products, see Examples/IncidenceBenchmark.
+    """
+    _incidence['enabled'] = bool(enabled)
+
+def get_incidence_kernels():
+    """Whether d(.) applies the incidence tables of the complex"""
+    return _incidence['enabled']
+
+def _parallel_rows(num_rows, function):
+    # calls function(start, stop) on consecutive blocks of rows, one per thread
+    num_threads = _threads['num_threads']
+    bounds = [(num_rows * i) // num_threads for i in range(num_threads + 1)]
+    blocks = [(start, stop) for start,stop in zip(bounds[:-1], bounds[1:]) if start < stop]
+    for result in _threads['executor'].map(lambda block: function(*block), blocks):
+        pass
+
+def _use_threads(work):
+    return _threads['num_threads'] > 1 and work >= _parallel_threshold
 
 class cochain:
     """
@@ -16,6 +90,10 @@ class cochain:
   
     Use the get_cochain() and get_cochain_basis() members of the SimplicialComplex class to
     safely avoid issues with v.    
+
+    The get_cochain_operator() member of the SimplicialComplex class stores an identity
+    LinearOperator in v instead.  Operations are then composed without assembling them,
+    which is useful for iterative solvers.
     """
     
     def __init__(self,complex,dimension,is_primal):                
@@ -26,20 +104,27 @@ class cochain:
         self.v = None
     def __add__(self,other):
         assert(self.k == other.k and self.complex == other.complex)
-        f = cochain(self.complex,self.k,self.is_primal)
+        f = type(self)(self.complex,self.k,self.is_primal)
         f.v = self.v + other.v
         return f
     def __sub__(self,other):
         assert(self.k == other.k and self.complex == other.complex)        
-        f = cochain(self.complex,self.k,self.is_primal)
+        f = type(self)(self.complex,self.k,self.is_primal)
         f.v = self.v - other.v
         return f
+    def __iadd__(self,other):
+        assert(self.k == other.k and self.complex == other.complex)
+        self.v += other.v
+        return self
+    def __isub__(self,other):
+        assert(self.k == other.k and self.complex == other.complex)
+        self.v -= other.v
+        return self
     def __getitem__(self,key):      
         if isinstance(key,Simplex):
-            data = self.complex[len(key) - 1]
-            index = data.simplex_to_index[key]
+            index,parity = self.__lookup(key)
             value = self.v.__getitem__(index)
-            if key.parity == data.simplex_parity[index]:
+            if key.parity == parity:
                 return value
             else:
                 return -value            
@@ -47,84 +132,302 @@ class cochain:
             return self.v.__getitem__(key)
     def __setitem__(self,key,value):
         if isinstance(key,Simplex):
-            data = self.complex[len(key) - 1]
-            index = data.simplex_to_index[key]            
-            if key.parity == data.simplex_parity[index]:
+            index,parity = self.__lookup(key)
+            if key.parity == parity:
                 self.v.__setitem__(index,value)
             else:
                 self.v.__setitem__(index,-value)            
         else:
             self.v.__setitem__(key,value)
+    def __lookup(self,key):
+        # index and parity of a simplex, missing simplices raise KeyError
+        try:
+            index,parity = self.complex[len(key) - 1].simplex_lookup([key])
+        except ValueError:
+            raise KeyError(key)
+        return index[0],parity[0]
             
     def __str__(self):
         return 'cochain(k='+str(self.k) + ',n=' + str(self.n) + ',is_primal=' + str(self.is_primal) + '\n' + str(self.v) + ')'
+
+
+class cochain_block(cochain):
+    """
+    Represents a block of m cochains of the same dimension
+
+    The values are stored in the columns of v, a C-contiguous N-by-m array, so that
+    d(.), star(.), etc. apply to all cochains of the block with a single sparse-times-dense
+    product.  The results of these operations are cochain blocks as well.
+
+    Use the get_cochain_block() member of the SimplicialComplex class to create blocks.
+    """
+
+    def num_cochains(self):
+        return self.v.shape[1]
+
+    def chunks(self, size):
+        """Iterate over blocks of at most size consecutive cochains
+
+        The values of each chunk are a contiguous copy, so modifying them 
+        does not modify this block.
+        """
+        for start in range(0, self.num_cochains(), size):
+            c = type(self)(self.complex, self.k, self.is_primal)
+            c.v = ascontiguousarray(self.v[:, start:start + size])
+            yield c
+
+    def __str__(self):
+        return 'cochain_block(k='+str(self.k) + ',n=' + str(self.n) + ',is_primal=' + str(self.is_primal) + '\n' + str(self.v) + ')'
     
             
-def d(f):
+def d(f, out=None):
     """
     Implements the discrete exterior derivative d(.)
     
     Accepts a cochain and returns the discrete d applied to the cochain    
+
+    When a (k+1)-cochain out is given, the result is stored in out.v, 
+    without temporary arrays when the values of f are dense, and out
+    is returned.
     """
+    df = _output(f, f.k + 1, f.is_primal, out)
+
+    # key of the operator in the operator cache, None for temporaries
+    key = None
+
     if f.is_primal:
-        df = cochain(f.complex, f.k + 1, f.is_primal)
         if f.k == -1:
-            df.v = sparse.csr_matrix((f.complex[0].num_simplices,1)) * f.v
+            A = sparse.csr_matrix((f.complex[0].num_simplices,1))
         elif f.k < -1 or f.k > f.n + 1:
-            df.v = sparse.csr_matrix((1,1)) * f.v
+            A = sparse.csr_matrix((1,1))
         else:
-            df.v = f.complex[f.k].d * f.v
-        return df
+            A,key = f.complex[f.k].d,('d',f.k)
+        if _use_incidence(f, f.k + 1):
+            data = f.complex[f.k + 1]
+            df.v = _store(incidence_gather(data.face_indices, data.face_signs, f.v), df.v)
+        else:
+            df.v = _product(f.complex, A, f.v, df.v, key)
     else:
-        df = cochain(f.complex,f.k + 1,f.is_primal)
         if f.k == -1:
-            df.v = sparse.csr_matrix((f.complex[f.n].num_simplices,1)) * f.v
+            A = sparse.csr_matrix((f.complex[f.n].num_simplices,1))
         elif f.k < -1 or f.k > f.n + 1:
-            df.v = sparse.csr_matrix((1,1)) * f.v
+            A = sparse.csr_matrix((1,1))
+        else:
+            A,key = f.complex[f.n - f.k].boundary,('boundary',f.n - f.k)
+        if _use_incidence(f, f.n - f.k):
+            data = f.complex[f.n - f.k]
+            df.v = _store(incidence_scatter(data.face_indices, data.face_signs, f.v,
+                                            f.complex[f.n - f.k - 1].num_simplices), df.v)
         else:
-            df.v = f.complex[f.n - f.k].boundary * f.v
-            df.v *= (-1) ** f.k        
-        return df
+            df.v = _product(f.complex, A, f.v, df.v, key)
+        if 0 <= f.k <= f.n + 1 and f.k % 2 == 1:
+            df.v *= -1
+    return df
 
-def star(f):
+def star(f, out=None):
     """
     Implements the discrete Hodge star *(.)
     
     Accepts a cochain and returns the Hodge star applied to the cochain    
+
+    When an (n-k)-cochain out is given, the result is stored in out.v
+    and out is returned.
     """
+    starf = _output(f, f.n - f.k, not f.is_primal, out)
+
     if f.k == -1 or f.k == f.n + 1:
-        starf = cochain(f.complex, f.n - f.k, not f.is_primal)
-        starf.v = f.v
-        return starf        
+        if _is_dense(starf.v):
+            starf.v[...] = f.v
+        else:
+            starf.v = f.v
     elif f.is_primal:
-        starf = cochain(f.complex, f.n - f.k, not f.is_primal)        
-        starf.v = f.complex[f.k].star * f.v
-        return starf
+        starf.v = _star_product(f.complex[f.k], f.v, out=starf.v)
     else:
-        starf = cochain(f.complex, f.n - f.k, not f.is_primal)
-        starf.v = f.complex[f.n - f.k].star_inv * f.v
-        return starf
+        starf.v = _star_product(f.complex[f.n - f.k], f.v, inverse=True, out=starf.v)
+    return starf
 
-def delta(f):
+def _output(f, k, is_primal, out):
+    # cochain in which the result of an operation on f is stored
+    if out is None:
+        return type(f)(f.complex, k, is_primal)
+    if out.k != k or out.is_primal != is_primal or out.complex is not f.complex:
+        raise ValueError('output cochain does not match the result')
+    return out
+
+def _temporary(f, key, k, is_primal):
+    # cochain whose values are a workspace buffer of the complex, or 
+    # None when the values of f are not dense
+    c = type(f)(f.complex, k, is_primal)
+    if _is_dense(f.v):
+        n = f.complex.complex_dimension()
+        if 0 <= k <= n:
+            N = f.complex[k if is_primal else n - k].num_simplices
+        else:
+            N = 1
+        c.v = f.complex.workspace((key, k, is_primal), (N,) + f.v.shape[1:],
+                                  result_type(f.v.dtype, float))
+    return c
+
+def _use_incidence(f, level):
+    # the tables of levels 1..n represent their boundary operators
+    return _incidence['enabled'] and _is_dense(f.v) and f.v.dtype.kind == 'f' and \
+           1 <= level <= f.n
+
+def _is_dense(v):
+    return type(v) is ndarray
+
+def _star_product(data, v, inverse=False, out=None):
+    # Sparse values are multiplied by the star matrix, matrix-free values
+    # are composed with a diagonal operator and dense values are scaled 
+    # by the diagonal
+    if sparse.issparse(v):
+        if inverse:
+            result = data.star_inv * v
+        else:
+            result = data.star * v
+        return _store(result, out)
+    
+    if inverse:
+        diagonal = data.star_inv_diag
+    else:
+        diagonal = data.star_diag
+
+    if isinstance(v, LinearOperator):
+        return _diagonal_operator(diagonal) * v
+    else:
+        return _diagonal_product(diagonal, v, out)
+
+def _diagonal_product(diagonal, v, out=None):
+    diagonal = diagonal.reshape((-1,) + (1,) * (ndim(v) - 1))
+
+    if not (_is_dense(v) and _use_threads(v.size)):
+        return multiply(diagonal, v, out=out)
+
+    if out is None:
+        out = empty(v.shape, dtype=result_type(diagonal, v))
+
+    def block(start, stop):
+        multiply(diagonal[start:stop], v[start:stop], out=out[start:stop])
+    _parallel_rows(len(v), block)
+
+    return out
+
+def _diagonal_operator(diagonal):
+    N = len(diagonal)
+    matvec = lambda x: _diagonal_product(diagonal, x)
+    return LinearOperator((N,N), matvec=matvec, rmatvec=matvec, matmat=matvec,
+                          dtype=diagonal.dtype)
+
+def _store(result, out):
+    if out is None or not _is_dense(out):
+        return result
+    out[...] = result
+    return out
+
+def _product(complex, A, v, out=None, key=None):
+    # composes the operators when v is a LinearOperator, and writes dense
+    # results directly into out when possible
+    if isinstance(v, LinearOperator):
+        return aslinearoperator(A) * v
+
+    if not (_is_dense(v) and sparse.issparse(A)):
+        return _store(A * v, out)
+
+    if _sparsetools is None:
+        return _store(A @ v, out)
+
+    # the kernels require matching types.  Matrices of the complex are 
+    # converted once and kept in the operator cache, temporaries are 
+    # converted on every product.  Threads split the rows of a CSR 
+    # matrix, which sums the entries of each row in the same order as 
+    # the CSC kernel.
+    dtype = result_type(A.dtype, v.dtype)
+    parallel = _use_threads(A.nnz * (v.size // max(len(v), 1)))
+
+    if A.dtype != dtype or not (sparse.isspmatrix_csr(A) or 
+                                (sparse.isspmatrix_csc(A) and not parallel)):
+        if key is None:
+            A = sparse.csr_matrix(A, dtype=dtype)
+        else:
+            A = complex.operator_cache.converted(key, A, dtype)
+
+    v = ascontiguousarray(v, dtype=dtype)
+
+    shape = (A.shape[0],) + v.shape[1:]
+    if _is_dense(out) and out.shape == shape and out.dtype == dtype and \
+            out.flags.c_contiguous and not may_share_memory(v, out):
+        y = out
+    else:
+        y = empty(shape, dtype)
+
+    if sparse.isspmatrix_csr(A):
+        matvec,matvecs = _sparsetools.csr_matvec,_sparsetools.csr_matvecs
+    else:
+        matvec,matvecs = _sparsetools.csc_matvec,_sparsetools.csc_matvecs
+
+    M,N = A.shape
+
+    def block(start, stop):
+        if sparse.isspmatrix_csr(A):
+            indptr = A.indptr[start:stop + 1]
+        else:
+            indptr = A.indptr
+        z = y[start:stop]
+        z.fill(0)
+        if ndim(v) == 1:
+            matvec(stop - start, N, indptr, A.indices, A.data, v, z)
+        else:
+            matvecs(stop - start, N, v.shape[1], indptr, A.indices, A.data, 
+                    v.ravel(), z.ravel())
+
+    if parallel:
+        _parallel_rows(M, block)
+    else:
+        block(0, M)
+
+    if y is out:
+        return out
+    return _store(y, out)
+
+def delta(f, out=None):
     """
     Implements the discrete codifferental  \delta(.)
     
     Accepts a cochain and returns the codifferental of the cochain    
+
+    When a (k-1)-cochain out is given, the result is stored in out.v, 
+    using workspace buffers of the complex for intermediate values when
+    the values of f are dense, and out is returned.
     """
-    sdsf = star(d(star(f)))    
+    if out is None:
+        sdsf = star(d(star(f)))    
+    else:
+        sf   = star(f, out=_temporary(f, 'delta', f.n - f.k, not f.is_primal))
+        dsf  = d(sf, out=_temporary(f, 'delta', f.n - f.k + 1, not f.is_primal))
+        sdsf = star(dsf, out=out)
     sdsf.v *= (-1)**(f.n*(f.k-1)+1)
     return sdsf
     
-def laplace_derham(f):    
+def laplace_derham(f, out=None):    
     """
     Implements the discrete Laplace-de Rham \del(.)
     
     Accepts a cochain and returns the Laplace-de Rham of the cochain    
-    
+
+    When a k-cochain out is given, the result is stored in out.v, using
+    workspace buffers of the complex for intermediate values when the 
+    values of f are dense, and out is returned.
     """
-    return d(delta(f)) + delta(d(f))
+    if out is None:
+        return d(delta(f)) + delta(d(f))
+
+    df = d(f, out=_temporary(f, 'laplace_derham', f.k + 1, f.is_primal))
+    dd = delta(df, out=_temporary(f, 'laplace_derham', f.k, f.is_primal))
+    out = d(delta(f, out=_temporary(f, 'laplace_derham', f.k - 1, f.is_primal)), out=out)
+    out += dd
+    return out
     
-def laplace_beltrami(f):
+def laplace_beltrami(f, out=None):
     """
     Implements the discrete Laplace-Beltrami \del(.) = \delta d
     
@@ -132,8 +435,13 @@ def laplace_beltrami(f):
     
     In the case of 0-forms, the second term of the Laplace-de Rham d(\delta(.)) is 0
     so the Laplace-Beltrami and Laplace-de Rham will be the same.
+
+    When a k-cochain out is given, the result is stored in out.v and out 
+    is returned.
     """    
-    return delta(d(f))
+    if out is None:
+        return delta(d(f))
+    return delta(d(f, out=_temporary(f, 'laplace_beltrami', f.k + 1, f.is_primal)), out=out)
     
     
     
@@ -0,0 +1,101 @@
+__all__ = ['incidence_table', 'incidence_gather', 'incidence_scatter']
+
+from numpy import bincount, diff, empty, ndim, zeros, result_type
+from scipy.sparse import csc_matrix
+
+
+def incidence_table(B):
+    """Fixed-width face table of a boundary operator
+
+    Every k-simplex (or k-cube) has the same number of faces, so each
+    column of a boundary operator has the same number m of nonzeros.
+    The faces of column j and their signs are stored in row j of two
+    dense N-by-m arrays.
+
+    Parameters
+    ----------
+    B : sparse matrix
+        Boundary operator, with one column per k-simplex
+
+    Returns
+    -------
+    faces : array
+        faces[j] holds the (sorted) indices of the faces of simplex j
+    signs : array
+        signs[j,i] is the entry of B in row faces[j,i] and column j
+
+    Example
+    -------
+
+    >>> from scipy.sparse import csr_matrix
+    >>> B = csr_matrix([[-1,0],[1,-1],[0,1]])
+    >>> faces,signs = incidence_table(B)
+    >>> faces
+    array([[0, 1],
+           [1, 2]])
+    >>> signs
+    array([[-1,  1],
+           [-1,  1]])
+
+    """
+    B = csc_matrix(B)
+    B.sum_duplicates()
+
+    num_faces,num_simplices = B.shape
+
+    if num_simplices == 0:
+        width = 0
+    else:
+        width = B.nnz // num_simplices
+
+    if (diff(B.indptr) != width).any():
+        raise ValueError('expected the same number of nonzeros in each column')
+
+    faces = B.indices.reshape(num_simplices, width)
+    signs = B.data.reshape(num_simplices, width)
+
+    return faces,signs
+
+
+def incidence_gather(faces, signs, x):
+    """Apply the transpose of a boundary operator, given by its
+    incidence table, to the columns of x
+
+    Computes y[j] = sum_i signs[j,i] * x[faces[j,i]], which is the
+    discrete exterior derivative of the cochain x.
+    """
+    num_simplices,width = faces.shape
+
+    y = zeros((num_simplices,) + x.shape[1:], dtype=result_type(signs, x))
+
+    if ndim(x) == 1:
+        for i in range(width):
+            y += signs[:,i] * x[faces[:,i]]
+    else:
+        for i in range(width):
+            y += signs[:,i].reshape(-1,1) * x[faces[:,i]]
+
+    return y
+
+
+def incidence_scatter(faces, signs, x, num_faces):
+    """Apply a boundary operator, given by its incidence table, to the
+    columns of x
+
+    Computes y[faces[j,i]] += signs[j,i] * x[j] over all simplices j
+    and faces i.
+    """
+    num_simplices,width = faces.shape
+
+    indices = faces.ravel()
+
+    if ndim(x) == 1:
+        return bincount(indices, weights=(signs * x.reshape(-1,1)).ravel(),
+                        minlength=num_faces)
+
+    y = empty((num_faces,x.shape[1]))
+    for n in range(x.shape[1]):
+        y[:,n] = bincount(indices, weights=(signs * x[:,n].reshape(-1,1)).ravel(),
+                          minlength=num_faces)
+
+    return y
@@ -0,0 +1,142 @@
+__all__ = ['operator_cache']
+
+from collections import OrderedDict
+
+import numpy
+from scipy import sparse
+
+from .cochain import d, delta, laplace_beltrami, laplace_derham
+
+
+class operator_cache:
+    """Cache of assembled DEC operators of a simplicial complex
+
+    Operators are identified by name, dimension and whether they act on
+    primal or dual cochains.  They are assembled by applying the
+    corresponding cochain operation to a cochain basis, stored in CSR
+    format, and kept until the total size of the cached operators
+    exceeds max_bytes, at which point the least recently used
+    operators are evicted.
+
+    Parameters
+    ----------
+    complex : simplicial_complex
+        Complex on which the operators act
+    max_bytes : integer or None
+        Memory budget of the cache in bytes, or None for no limit
+
+    Examples
+    --------
+    >>> from pydec import simplicial_complex
+    >>> sc = simplicial_complex(([[0,0],[1,0],[0,1]],[[0,1,2]]))
+    >>> L = sc.operator_cache.get('laplace_beltrami', 0)
+    >>> L is sc.operator_cache.get('laplace_beltrami', 0)
+    True
+
+    """
+
+    # the cochain operations which may be cached
+    operators = {'d' : d,
+                 'delta' : delta,
+                 'laplace_beltrami' : laplace_beltrami,
+                 'laplace_derham' : laplace_derham}
+
+    # operators which only depend on the topology of the complex
+    topological = ['d']
+
+    def __init__(self, complex, max_bytes=2**28):
+        self.complex   = complex
+        self.max_bytes = max_bytes
+        self.nbytes    = 0
+        self.cache     = OrderedDict()
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __contains__(self, key):
+        return key in self.cache
+
+    def get(self, name, k, is_primal=True):
+        """Assembled operator, as a sparse matrix acting on the values of
+        k-cochains
+
+        The returned matrix is shared by all callers and should not be
+        modified.
+        """
+        if name not in self.operators:
+            raise ValueError('unknown operator (%s)' % name)
+
+        key = (name, k, bool(is_primal))
+
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        basis = self.complex.get_cochain_basis(k, is_primal)
+        A = sparse.csr_matrix(self.operators[name](basis).v)
+
+        self.cache[key] = A
+        self.nbytes += _matrix_nbytes(A)
+        self.__evict()
+
+        return A
+
+    def converted(self, name, A, dtype):
+        """Copy of a sparse matrix of the complex in CSR format with 
+        entries of the given type
+
+        Sparse kernels require the entries of a matrix to have the type
+        of the values it multiplies, so integer matrices, such as the 
+        boundary operators, are converted before products with real 
+        values.  The converted copies are kept in the cache under the 
+        given name, for instance ('boundary', k), and count towards the
+        same memory budget as the assembled operators.  A copy is 
+        replaced when the complex stores a different matrix A under the
+        same name.
+        """
+        dtype = numpy.dtype(dtype)
+        key = ('converted', name, dtype)
+
+        if key in self.cache and self.cache[key][0] is A:
+            self.cache.move_to_end(key)
+            return self.cache[key][1]
+
+        if key in self.cache:
+            self.nbytes -= _entry_nbytes(self.cache.pop(key))
+
+        B = sparse.csr_matrix(A, dtype=dtype)
+
+        self.cache[key] = (A,B)
+        self.nbytes += _matrix_nbytes(B)
+        self.__evict()
+
+        return B
+
+    def invalidate(self, metric_only=False):
+        """Remove cached operators
+
+        When metric_only is True, operators which only depend on the
+        topology of the complex, and converted matrices, are kept.
+        """
+        for key in list(self.cache.keys()):
+            if metric_only and key[0] in self.topological + ['converted']:
+                continue
+            self.nbytes -= _entry_nbytes(self.cache.pop(key))
+
+    def __evict(self):
+        ## drop least recently used operators until within budget
+        if self.max_bytes is None:
+            return
+        while self.nbytes > self.max_bytes and len(self.cache) > 0:
+            key,entry = self.cache.popitem(last=False)
+            self.nbytes -= _entry_nbytes(entry)
+
+
+def _matrix_nbytes(A):
+    return A.data.nbytes + A.indices.nbytes + A.indptr.nbytes
+
+def _entry_nbytes(entry):
+    # converted matrices are stored along with the matrix they copy
+    if isinstance(entry, tuple):
+        return _matrix_nbytes(entry[1])
+    return _matrix_nbytes(entry)
@@ -1,11 +1,11 @@
-from numpy import ones, arange, array, asarray, hstack, empty, lexsort
+from numpy import ones, arange, array, asarray, hstack, empty
 from scipy.sparse import csr_matrix, csc_matrix
 
 from pydec.mesh.simplex import simplex
 from pydec.math import kd_tree
 from pydec.util import flatten
 
-from .simplex_array import simplex_array_searchsorted
+from .simplex_array import simplex_array_searchsorted, simplex_key
 
 __all__ = ['rips_complex']
 
@@ -220,7 +220,7 @@ def rips_simplices(num_vertices, edges, k):
     
     edges = edges[edges[:,0] < edges[:,1]]   # orient edges 
     if edges.shape[0] != 0:
-        edges = edges[lexsort( edges.T[::-1] )]  # sort edges 
+        edges = edges[simplex_key(edges).argsort()]  # sort edges 
         simplices.append( edges )
 
     if k == 1 or edges.shape[0] == 0: return simplices
@@ -1,12 +1,82 @@
-__all__ = ['simplex_array_searchsorted','simplex_array_boundary','simplex_array_parity']
+__all__ = ['simplex_array_searchsorted','simplex_array_boundary','simplex_array_parity',
+           'simplex_array_lookup','simplex_key']
 
 
-from numpy import ravel, zeros, ones, arange, empty, array, lexsort, \
-    hstack, vstack, ndim, bincount, cumsum, ascontiguousarray, zeros_like, \
-    concatenate, asarray
-from numpy import all as alltrue  #temporary fix. Change above to np.*     
+from numpy import ravel, zeros, arange, empty, array, hstack, ndim, \
+    bincount, ascontiguousarray, zeros_like, asarray, sort, minimum, \
+    dtype, int64
 from scipy.sparse import csr_matrix
 
+
+def simplex_key(s, num_vertices=None):
+    """Pack the rows of a simplex array into sortable keys
+
+    Each row of s is read as the digits of an integer in base 
+    num_vertices.  When a whole row fits in a 64-bit integer the keys
+    are an int64 array, otherwise the columns are split into groups
+    that each fit in 64 bits and the keys are a structured array with
+    one int64 field per group.  In both cases the keys compare like the 
+    rows of s in lexicographical order, so they may be passed directly 
+    to argsort, searchsorted, unique, etc.
+
+    Parameters
+    ----------
+    s : array_like
+        Simplex array with nonnegative vertex indices
+    num_vertices : integer, optional
+        Bound on the vertex indices, all of which must be less than 
+        num_vertices.  Defaults to s.max() + 1.  Keys are only 
+        comparable when computed with the same num_vertices.
+
+    Returns
+    -------
+    keys : array
+        One key for each row of s
+
+    Example
+    -------
+
+    >>> from numpy import array
+    >>> s = array([[0,1],[0,2],[1,2],[1,3]])
+    >>> simplex_key(s)
+    array([1, 2, 6, 7])
+
+    """
+
+    s = asarray(s)
+
+    if ndim(s) != 2:
+        raise ValueError('expected rank 2 array')
+
+    M,N = s.shape
+
+    if num_vertices is None:
+        num_vertices = int(s.max()) + 1 if s.size > 0 else 1
+    base = max(int(num_vertices), 2)
+
+    # number of digits that fit in a nonnegative int64
+    digits = 0
+    while base**(digits + 1) <= 2**63:
+        digits += 1
+
+    def pack(columns):
+        key = zeros(M, dtype=int64)
+        for j in columns:
+            key *= base
+            key += s[:,j]
+        return key
+
+    if N <= digits:
+        return pack(range(N))
+
+    groups = [range(i, min(i + digits, N)) for i in range(0, N, digits)]
+    keys = empty(M, dtype=dtype([('k%d' % i, int64) for i in range(len(groups))]))
+    for i,columns in enumerate(groups):
+        keys['k%d' % i] = pack(columns)
+
+    return keys
+
+
 def simplex_array_searchsorted(s, v):
     """Find the row indices (of s) corresponding to the simplices stored 
     in the rows of simplex array v.  The rows of s must be stored in 
@@ -32,16 +102,15 @@ def simplex_array_searchsorted(s, v):
     if s.shape[1] != v.shape[1]:
         raise ValueError('number of columns must agree')
    
-    # compute row indices by sorting both arrays together
-    Ns = s.shape[0]
-    Nv = v.shape[0]
-    
-    perm = lexsort(vstack((s,v))[:,::-1].T)
-    
-    flags = concatenate( (ones(Ns,dtype=int),zeros(Nv,dtype=int)) )
-    indices = empty(Ns+Nv, dtype=int)
-    indices[perm] = cumsum(flags[perm])
-    indices = indices[Ns:].copy()
+    # compare keys computed in a common base 
+    num_vertices = 1
+    if s.size > 0: num_vertices = max(num_vertices, int(s.max()) + 1)
+    if v.size > 0: num_vertices = max(num_vertices, int(v.max()) + 1)
+
+    s_keys = simplex_key(s, num_vertices)
+    v_keys = simplex_key(v, num_vertices)
+
+    indices = s_keys.searchsorted(v_keys, side='right').astype(int)
     indices -= 1
 
     return indices
@@ -49,6 +118,90 @@ def simplex_array_searchsorted(s, v):
 
 
 
+def simplex_array_lookup(s, v, order=None, keys=None, num_vertices=None):
+    """Find the rows of s corresponding to the simplices stored in the
+    rows of simplex array v, together with their relative parities.
+
+    The rows of s must be sorted (e.g. [0,1,2] and not [0,2,1]) and, 
+    unless a permutation order is given, stored in lexicographical order.
+    The rows of v may list their vertices in any order.
+    
+    Parameters
+    ----------
+    s : array
+        Simplex array with sorted rows
+    v : array_like
+        Simplex array of the simplices to find in s
+    order : array, optional
+        Permutation of the rows of s such that s[order] is stored
+        in lexicographical order
+    keys : array, optional
+        Precomputed simplex_key(s[order], num_vertices), which avoids 
+        recomputing the keys of s in repeated lookups
+    num_vertices : integer, optional
+        Base of the precomputed keys, required when keys are given
+
+    Returns
+    -------
+    indices : array
+        Row indices of s, one for each row of v
+    parity : array
+        Parity of each row of v relative to the sorted simplex
+
+    Example
+    -------
+
+    >>> from numpy import array
+    >>> s = array([[0,1],[0,2],[1,2],[1,3]])
+    >>> v = array([[2,1],[0,2]])
+    >>> simplex_array_lookup(s,v)
+    (array([2, 1]), array([1, 0]))
+
+    """
+
+    s = asarray(s)
+    v = asarray(v)
+
+    if ndim(s) != 2 or ndim(v) != 2:
+        raise ValueError('expected rank 2 arrays')
+
+    if s.shape[1] != v.shape[1]:
+        raise ValueError('number of columns must agree')
+
+    Ns = s.shape[0]
+    Nv = v.shape[0]
+
+    if keys is None:
+        num_vertices = int(s.max()) + 1 if s.size > 0 else 1
+        if order is None:
+            keys = simplex_key(s, num_vertices)
+        else:
+            keys = simplex_key(s[order], num_vertices)
+    elif num_vertices is None:
+        raise ValueError('num_vertices is required with precomputed keys')
+
+    parity = simplex_array_parity(v)
+    v = sort(v, axis=1)
+
+    if Nv == 0:
+        return zeros(0, dtype=int),parity
+
+    # vertices outside the range of s cannot belong to a simplex of s
+    if Ns == 0 or v.min() < 0 or v.max() >= num_vertices:
+        raise ValueError('simplex not found')
+
+    v_keys  = simplex_key(v, num_vertices)
+    indices = minimum(keys.searchsorted(v_keys), Ns - 1)
+
+    if (keys[indices] != v_keys).any():
+        raise ValueError('simplex not found')
+
+    if order is not None:
+        indices = order[indices]
+
+    return indices,parity
+
+
 def simplex_array_parity(s):
     """Compute the relative parity of an array of simplices
     """
@@ -109,10 +262,13 @@ def simplex_array_boundary(s,parity):
         rows[:, -1  ] = ((-1)**i)*orientations
 
     #sort rows
-    faces = faces[lexsort( faces[:,:-2].T[::-1] )]
+    keys  = simplex_key(faces[:,:-2])
+    perm  = keys.argsort(kind='stable')
+    faces = faces[perm]
+    keys  = keys[perm]
 
     #find unique faces
-    face_mask    = ~hstack((array([False]), alltrue(faces[1:,:-2] == faces[:-1,:-2], axis=1)))
+    face_mask    = hstack((array([True]), keys[1:] != keys[:-1]))
 
     unique_faces = faces[face_mask,:-2]
 
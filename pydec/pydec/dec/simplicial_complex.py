@@ -4,16 +4,22 @@ from warnings import warn
 
 import numpy
 import scipy
-from numpy import array, dot, inner, ones, cross, copysign, zeros, asarray, hstack
+from numpy import array, dot, inner, ones, cross, copysign, zeros, asarray, \
+        hstack, bincount, arange, einsum
+from numpy.linalg import norm
 from scipy import sparse
+from scipy.sparse.linalg import LinearOperator
 
 import pydec
 from pydec.mesh.simplex import simplex, simplicial_mesh
-from pydec.math import (circumcenter, unsigned_volume, signed_volume,
-                            circumcenter_barycentric)
+from pydec.math import (signed_volume_array, unsigned_volume_array,
+                        circumcenter_barycentric_array)
 
-from .simplex_array import simplex_array_parity, simplex_array_boundary
-from .cochain import cochain
+from .simplex_array import simplex_array_parity, simplex_array_boundary, \
+        simplex_array_lookup, simplex_key
+from .incidence import incidence_table
+from .cochain import cochain, cochain_block
+from .operator_cache import operator_cache
 
 
 class simplicial_complex(list):
@@ -25,6 +31,16 @@ class simplicial_complex(list):
         - simplicial_complex( M )
             - where M is a simplicial_mesh object
 
+    By default, the simplices and boundary operators of all dimensions
+    are built on construction.  The keyword argument dimensions limits
+    construction to the given dimensions (and those above them), e.g.
+        - simplicial_complex( (V,S), dimensions=[1,2] )
+    and the remaining levels compute their faces and boundary operators
+    on first access.
+
+    Assembled operators such as Laplacians are cached by
+        - sc.operator_cache.get( 'laplace_beltrami', k )
+
 
     Examples
     ========
@@ -38,8 +54,11 @@ class simplicial_complex(list):
 
     """
 
+    # cached attributes of each level which depend on the vertex positions
+    metric_attributes = ['primal_volume', 'dual_volume', 'circumcenter',
+                         'bary_circumcenter', 'barycentric_gradients']
         
-    def __init__(self, arg1, arg2=None):                    
+    def __init__(self, arg1, arg2=None, dimensions=None):                    
 
         if arg2 is not None:
             warn('initializing a simplicial_complex with' \
@@ -61,7 +80,10 @@ class simplicial_complex(list):
         self.vertices  = self.mesh['vertices']
         self.simplices = self.mesh['elements']
     
-        self.build_complex(self.simplices)
+        self.build_complex(self.simplices, dimensions)
+
+        self.operator_cache = operator_cache(self)
+        self.buffers = {}
     
     def __repr__(self):
         output = ""
@@ -117,91 +139,235 @@ class simplicial_complex(list):
         
         return c   
 
-    def build_complex(self, simplex_array):
-        """Compute faces and boundary operators for all dimensions"""
-        N,K = simplex_array.shape
+    def workspace(self, key, shape, dtype=float):
+        """Reusable array for intermediate values
 
-        s = simplex_array.copy()
-        parity = simplex_array_parity(s)
-        s.sort()
+        Returns the array stored under the given key when it has the
+        requested shape and dtype, and otherwise replaces it with a new 
+        uninitialized array.  The operations in pydec.dec.cochain use 
+        these buffers to avoid allocations when an out argument is given.
+        """
+        shape = tuple(shape)
+        dtype = numpy.dtype(dtype)
+
+        A = self.buffers.get(key)
+        if A is None or A.shape != shape or A.dtype != dtype:
+            A = numpy.empty(shape, dtype=dtype)
+            self.buffers[key] = A
+        return A
+
+    def get_cochain_block(self, dimension, m, is_primal=True):
+        """Block of m zero cochains, stored in the columns of an 
+        N-by-m array
+        """
+        N = self.complex_dimension()
 
-        simplices = [s]
-        chain_complex = []
-        parities = [parity]
+        if not 0 <= dimension <= N:
+            raise ValueError('invalid dimension (%d)' % dimension)
+        
+        c   = cochain_block(self, dimension, is_primal)        
+        
+        if is_primal:
+            c.v = zeros((self[dimension].num_simplices, m))
+        else:
+            c.v = zeros((self[N - dimension].num_simplices, m))
+        
+        return c   
 
-        while s.shape[1] > 1:
-            s,boundary = simplex_array_boundary(s,parity)
-            parity = zeros(s.shape[0],dtype=s.dtype)
-            
-            simplices.append( s )
-            chain_complex.append( boundary )
-            parities.append( parity )
+    def get_cochain_operator(self, dimension, is_primal=True):
+        """Cochain whose values are the identity LinearOperator
+
+        Applying d(), star(), delta(), etc. to this cochain composes the
+        corresponding operators without assembling them.  The values of
+        the result are a LinearOperator which applies the boundary 
+        operators and Hodge star diagonals of the complex directly.
+
+        Examples
+        --------
+        >>> from pydec import simplicial_complex, laplace_beltrami
+        >>> sc = simplicial_complex(([[0,0],[1,0],[0.5,1]],[[0,1,2]]))
+        >>> L = laplace_beltrami(sc.get_cochain_operator(0)).v
+        >>> L.matvec([1,1,1])
+        array([ 0.,  0.,  0.])
 
-        B0 = sparse.csr_matrix( (1,len(s)), dtype='uint8')
-        chain_complex.append( B0 )
+        """
+        N = self.complex_dimension()
 
-        simplices     = simplices[::-1]
-        chain_complex = chain_complex[::-1]
-        parities      = parities[::-1]
+        if not 0 <= dimension <= N:
+            raise ValueError('invalid dimension (%d)' % dimension)
+        
+        c   = cochain(self, dimension, is_primal)        
+        
+        if is_primal:
+            M = self[dimension].num_simplices
+        else:
+            M = self[N - dimension].num_simplices
 
-        Bn = chain_complex[-1]
-        cochain_complex  = [ B.T for B in chain_complex[1:] ]
-        cochain_complex += [ sparse.csc_matrix( (1, Bn.shape[1]), dtype=Bn.dtype) ] 
+        identity = lambda x: x
+        c.v = LinearOperator((M,M), matvec=identity, rmatvec=identity, 
+                             matmat=identity, dtype=float)
+        
+        return c   
+
+    def build_complex(self, simplex_array, dimensions=None):
+        """Compute faces and boundary operators
+
+        Parameters
+        ----------
+        simplex_array : array
+            Simplex array of the top level simplices
+        dimensions : iterable of integers, optional
+            Dimensions whose simplices are computed immediately, along 
+            with those of all higher dimensions and the boundary operators
+            between them.  Defaults to all dimensions.  Levels which are 
+            not built compute their faces and boundary operators on 
+            first access.
+        """
+        N,K = simplex_array.shape
+
+        if dimensions is None:
+            dimensions = range(K)
+        dimensions = list(dimensions)
+
+        for dim in dimensions:
+            if not 0 <= dim < K:
+                raise ValueError('invalid dimension (%d)' % dim)
+
+        s = simplex_array.copy()
+        parity = simplex_array_parity(s)
+        s.sort()
 
         for n in range(K):
             data = self.data_cache()
+            data.complex = self
+            data.dim     = n
+            self.append(data)
 
-            data.d              = cochain_complex[n]
-            data.boundary       = chain_complex[n]
-            data.complex        = self
-            data.dim            = n
-            data.simplices      = simplices[n]
-            data.num_simplices  = len(data.simplices)
-            data.simplex_parity = parities[n]
+        data = self[K - 1]
+        data.simplices      = s
+        data.num_simplices  = len(s)
+        data.simplex_parity = parity
 
-            self.append(data)
-     
+        # faces are computed from the top level down
+        for dim in reversed(range(min(dimensions + [K - 1]), K - 1)):
+            self.compute_faces(dim)
+
+    def compute_faces(self, dim):
+        """Compute the simplices of a given dimension and the boundary
+        operator of the simplices one dimension higher
+        """
+        data   = self[dim]
+        parent = self[dim + 1]
         
+        s,boundary = simplex_array_boundary(parent.simplices, parent.simplex_parity)
 
-    def construct_hodge(self):
-        """Construct the covolume Hodge star for all levels"""        
+        data.simplices      = s
+        data.num_simplices  = len(s)
+        data.simplex_parity = zeros(len(s), dtype=s.dtype)
+        parent.boundary     = boundary
+     
+    def construct_hodge(self, dim=None):
+        """Construct the covolume Hodge star for all levels, or only
+        for the given dimension
+
+        The diagonal of the Hodge star and of its inverse are stored in
+        the star_diag and star_inv_diag attributes of each level, while
+        the star and star_inv matrices are built from them on demand.
+        """        
         
-        for dim,data in enumerate(self):
-            form_size = data.num_simplices
-            data.star = sparse.lil_matrix((form_size,form_size))                      
-            data.star_inv = sparse.lil_matrix((form_size,form_size))
+        if dim is None:
+            dims = range(len(self))
+        else:
+            dims = [dim]
+
+        for dim in dims:
+            data = self[dim]
             
             stardiag = data.dual_volume / data.primal_volume
-            N = len(stardiag)
-            data.star     = sparse.spdiags([stardiag],    [0], N, N, format='csr')
-            data.star_inv = sparse.spdiags([1.0/stardiag],[0], N, N, format='csr')
             
             #Choose sign of star_inv to satisfy (star_inv * star) = -1 ^(k*(n-k))
             n,k = self.complex_dimension(),dim            
-            data.star_inv *= (-1) ** (k * (n - k))                   
+            stardiag_inv = (-1) ** (k * (n - k)) / stardiag
+
+            if 'star_diag' in vars(data):
+                # refresh in place, which also updates the matrices
+                data.star_diag[:]     = stardiag
+                data.star_inv_diag[:] = stardiag_inv
+            else:
+                data.star_diag     = stardiag
+                data.star_inv_diag = stardiag_inv
+
+    def update_vertices(self, vertices):
+        """Move the vertices of the complex, keeping its topology
+
+        The simplices and boundary operators are kept, while volumes, 
+        circumcenters and other metric quantities are discarded and 
+        recomputed on demand.  Cached operators which depend on the 
+        metric are discarded as well.  Hodge stars which have already been 
+        constructed are recomputed in place, so their diagonals, the
+        star matrices and any references to them remain valid.
+
+        Parameters
+        ----------
+        vertices : array_like
+            New vertex coordinates, with the same shape as the current ones
+
+        Examples
+        --------
+        >>> from pydec import simplicial_complex
+        >>> sc = simplicial_complex(([[0,0],[1,0],[0,1]],[[0,1,2]]))
+        >>> sc[2].primal_volume
+        array([ 0.5])
+        >>> sc.update_vertices([[0,0],[2,0],[0,2]])
+        >>> sc[2].primal_volume
+        array([ 2.])
+
+        """
+        vertices = asarray(vertices)
+
+        if vertices.shape != self.vertices.shape:
+            raise ValueError('expected vertices with shape %s' % (self.vertices.shape,))
+
+        self.mesh['vertices'] = vertices
+        self.vertices = vertices
+
+        hodge = [data.dim for data in self if 'star_diag' in vars(data)]
+
+        for data in self:
+            for attr in self.metric_attributes:
+                vars(data).pop(attr, None)
+
+        for dim in hodge:
+            self.construct_hodge(dim)
+
+        self.operator_cache.invalidate(metric_only=True)
 
     def compute_bary_circumcenters(self,dim):
         """Compute circumcenters for all simplices at a given
         dimension in barycentric coordinates
         """
         data = self[dim]            
-        data.bary_circumcenter = zeros((data.num_simplices,
-                                        dim + 1))
-        
-        for i,s in enumerate(data.simplices):
-            pts = self.vertices[[x for x in s],:]
-            data.bary_circumcenter[i] = circumcenter_barycentric(pts)
+        pts = self.vertices[data.simplices]
+        data.bary_circumcenter = circumcenter_barycentric_array(pts)
             
     def compute_circumcenters(self,dim):
         """Compute circumcenters for all simplices at a given dimension
+
+        The circumcenters are the barycentric circumcenters of the 
+        simplices applied to their vertices, so the barycentric 
+        circumcenters are computed as well.
         """
         data = self[dim]            
-        data.circumcenter = zeros((data.num_simplices,
-                                       self.embedding_dimension()))
-        
-        for i,s in enumerate(data.simplices):
-            pts = self.vertices[[x for x in s],:]
-            data.circumcenter[i] = circumcenter(pts)[0]
+        pts = self.vertices[data.simplices]
+        data.circumcenter = einsum('ij,ijk->ik', data.bary_circumcenter, pts)
+
+    def compute_barycentric_gradients(self,dim):
+        """Compute the gradients of the barycentric basis functions of 
+        all simplices at a given dimension
+        """
+        data = self[dim]
+        pts = self.vertices[data.simplices]
+        data.barycentric_gradients = pydec.fem.barycentric_gradients_array(pts)
 
     def compute_primal_volume(self,dim):
         """Compute the volume of all simplices for a given dimension
@@ -210,99 +376,200 @@ class simplicial_complex(list):
         the signed volume is computed.        
         """
         data = self[dim]
-        data.primal_volume = zeros((data.num_simplices,))
 
         if dim == self.embedding_dimension():
-            for i,s in enumerate(self.simplices):
-                pts = self.vertices[s,:]            
-                data.primal_volume[i] = signed_volume(pts)
+            pts = self.vertices[self.simplices]
+            data.primal_volume = signed_volume_array(pts)
         else:
+            pts = self.vertices[data.simplices]
+            data.primal_volume = unsigned_volume_array(pts)
+
+    def compute_dual_volume(self, dim=0):
+        """Compute dual volumes for simplices of all dimensions, down
+        to the given dimension
+
+        The circumcentric dual cell of a k-simplex is the union of the cones
+        from its circumcenter over the dual cells of its (k+1)-dimensional
+        cofaces.  The segment joining the circumcenters of a face and a
+        coface is orthogonal to the dual cell of the coface, so each cone
+        has volume (height * base) / (n - k) and the dual volumes are 
+        computed level by level, starting from the top simplices.  Levels
+        whose dual volumes are already known are not recomputed.
+        """
+        n = self.complex_dimension()
 
-            for i,s in enumerate(data.simplices):
-                pts = self.vertices[s,:]            
-                data.primal_volume[i] = unsigned_volume(pts)
+        if 'dual_volume' not in vars(self[n]):
+            self[n].dual_volume = ones(self[n].num_simplices)
 
-    def compute_dual_volume(self):
-        """Compute dual volumes for simplices of all dimensions
-        """
-        for dim,data in enumerate(self):
-            data.dual_volume = zeros((data.num_simplices,))
-
-        temp_centers = zeros((self.complex_dimension() + 1,
-                                  self.embedding_dimension()))
-        temp_bcenters = [zeros(dim) for dim in
-                             range(1, self.complex_dimension() + 2)]
-        temp_signs = ones(self.complex_dimension() + 1)
-        for i,s in enumerate(self.simplices):
-            self.__compute_dual_volume(simplex(s),
-                                       None,
-                                       temp_centers,
-                                       temp_bcenters,
-                                       temp_signs,
-                                       self.complex_dimension())
+        for k in reversed(range(dim, n)):
+            if 'dual_volume' not in vars(self[k]):
+                self.__compute_dual_volume(k)
             
-    def __compute_dual_volume(self, s, parent, pts, bpts, signs, dim):    
-        ## s: simplex whose dual volume is desired (NumPy array)
-        ## parent: simplex initiating this call whose face is s (NumPy
-        ## array) 
-        ## pts: circumcenters at all dimensions (NumPy array)
-        ## bpts: circumcenters at all dimensions in barycentric 
-        ## coordinates (Python list)
-
-        ## Remark: Sign s is determined by location of cicumcenter
-        ## with respect to a face of a simplex and the opposite vertex
-        ## of the face in the simplex. It is +1 if the circumcenter
-        ## and the opposite vertex lie on the same side with respect
-        ## to the halfplane generated by the face. It is -1 if they
-        ## lie on opposite sides of this halfplane. Consequently, sign
-        ## can be determined as the sign of that component of the
-        ## barycentric coordiante of the circumcenter which
-        ## corresponds to the opposite vertex.
-
-        data = self[dim]
-        index = data.simplex_to_index[s]  
-        pts[dim] = data.circumcenter[index]
-        bpts[dim] = data.bary_circumcenter[index]
-        sgn = 1
-        if parent is not None:
-            opposite_vertex = list(set(parent) - set(s))[0]
-            ov_index = list(parent).index(opposite_vertex)
-            signs[dim] = copysign(1, bpts[-1][ov_index])
-        for i in range(dim, self.complex_dimension()):
-            sgn *= signs[i]
-        data.dual_volume[index] += sgn * unsigned_volume(pts[dim:,:])
-        if dim > 0:
-            for bs in s.boundary():
-                self.__compute_dual_volume(bs, s, pts, bpts, signs, dim-1)
+    def __compute_dual_volume(self, dim):
+        ## Computes the dual volumes at dimension dim from those at
+        ## dimension dim + 1
+
+        ## Remark: The sign of the cone over the dual cell of a coface
+        ## is determined by the location of the circumcenter of the
+        ## coface with respect to the face and the vertex of the
+        ## coface opposite the face. It is +1 if the circumcenter and
+        ## the opposite vertex lie on the same side with respect to
+        ## the halfplane generated by the face. It is -1 if they lie
+        ## on opposite sides of this halfplane. Consequently, sign can
+        ## be determined as the sign of that component of the
+        ## barycentric coordinate of the circumcenter of the coface 
+        ## which corresponds to the opposite vertex.
+
+        n = self.complex_dimension()
+        data   = self[dim]
+        parent = self[dim + 1]
+
+        # each entry of the incidence table is a (face,coface) pair
+        faces   = parent.face_indices.ravel()
+        cofaces = arange(parent.num_simplices).repeat(dim + 2)
+
+        parent_simplices = parent.simplices[cofaces]
+        opposite_vertex  = parent_simplices.sum(axis=1) - \
+                           data.simplices[faces].sum(axis=1)
+        ov_index = (parent_simplices == opposite_vertex.reshape(-1,1)).argmax(axis=1)
+        signs    = copysign(1, parent.bary_circumcenter[cofaces,ov_index])
+
+        heights = norm(data.circumcenter[faces] - parent.circumcenter[cofaces], axis=1)
+
+        weights = signs * heights * parent.dual_volume[cofaces]
+        data.dual_volume = bincount(faces, weights=weights,
+                                    minlength=data.num_simplices) / (n - dim)
 
 
     def boundary(self):
         """Return a list of the boundary simplices, i.e. the faces of the top level simplices that occur only once
         """
-    
-        assert(self.complex_dimension() > 0) 
-        old_keys = self[self.complex_dimension() - 1].simplex_to_index.keys()
-        face_count = dict.fromkeys(old_keys, 0)
-        
-        for s in self[self.complex_dimension()].simplex_to_index.keys():
-            for f in s.boundary():
-                face_count[f] += 1
-        
-        boundary_faces = [f for f, count in face_count.items() if count == 1]
-        return boundary_faces
+        indices = self.boundary_faces()[0]
+        faces = self[self.complex_dimension() - 1].simplices[indices]
+        return [simplex(f) for f in faces]
+
+    def boundary_faces(self, closure=False):
+        """Indices and orientations of the boundary faces
+
+        The boundary faces are the (n-1)-simplices which are faces of 
+        exactly one top level simplex.  They are found from the number of
+        nonzeros in each row of the top boundary operator.
+
+        Parameters
+        ----------
+        closure : bool
+            If True, also return the simplices of all dimensions which 
+            are faces of the boundary
+
+        Returns
+        -------
+        indices : array
+            Sorted indices of the boundary faces in self[n-1]
+        signs : array
+            Orientation (+1 or -1) of each boundary face relative to the
+            boundary of its top level simplex
+        faces : list of arrays
+            Only returned when closure is True.  faces[k] holds the 
+            sorted indices of the k-simplices in the closure of the 
+            boundary, for k = 0,...,n-1
+
+        Examples
+        --------
+        >>> from pydec import simplicial_complex
+        >>> sc = simplicial_complex(([[0,0],[1,0],[1,1],[0,1]],[[0,1,3],[1,2,3]]))
+        >>> sc.boundary_faces()
+        (array([0, 1, 2, 4]), array([ 1, -1,  1,  1]))
+
+        """
+        n = self.complex_dimension()
+        assert(n > 0) 
+
+        B = self[n].boundary.tocsr()
+        counts  = numpy.diff(B.indptr)
+        indices = numpy.flatnonzero(counts == 1)
+        signs   = B.data[B.indptr[indices]].astype(int)
+
+        if not closure:
+            return indices,signs
+
+        faces = [None] * n
+        faces[n - 1] = indices
+
+        mask = zeros(self[n - 1].num_simplices)
+        mask[indices] = 1
+        for k in reversed(range(n - 1)):
+            mask = abs(self[k + 1].boundary) * mask
+            faces[k] = numpy.flatnonzero(mask)
+            
+        return indices,signs,faces
         
 
     class data_cache:
         """caches the result of costly operations"""
+        def simplex_lookup(self, simplices):
+            """Indices and relative parities of an array of simplices
+
+            Parameters
+            ----------
+            simplices : array_like
+                Simplex array whose rows are simplices of this dimension,
+                with vertices listed in any order
+
+            Returns
+            -------
+            indices : array
+                Index of each simplex at this level of the complex
+            parity : array
+                Parity of each simplex relative to its orientation in 
+                the complex (0 when they agree, 1 otherwise)
+
+            Examples
+            --------
+            >>> from pydec import simplicial_complex
+            >>> sc = simplicial_complex(([[0,0],[1,0],[0,1]],[[0,1,2]]))
+            >>> sc[1].simplex_lookup([[2,1],[0,1]])
+            (array([2, 0]), array([1, 0]))
+            >>> sc[2].simplex_lookup([[1,0,2]])
+            (array([0]), array([1]))
+            
+            """
+            indices,parity = simplex_array_lookup(self.simplices, simplices,
+                                                  self.simplex_order, 
+                                                  self.simplex_keys,
+                                                  self.simplex_key_base)
+            parity ^= self.simplex_parity[indices]
+            return indices,parity
+
         def __getattr__(self,attr):
             #print "constructing: ",attr
-            if attr == "d":
-                return self.d.tocsr()
+            if attr in ["simplices", "num_simplices", "simplex_parity"]:
+                self.complex.compute_faces(self.dim)
+                return getattr(self, attr)
+            elif attr == "boundary":
+                if self.dim == 0:
+                    self.boundary = sparse.csr_matrix((1,self.num_simplices), dtype='uint8')
+                else:
+                    self.complex.compute_faces(self.dim - 1)
+                return self.boundary
+            elif attr in ["face_indices", "face_signs"]:
+                # fixed-width form of the boundary operator
+                self.face_indices,self.face_signs = incidence_table(self.boundary)
+                return getattr(self, attr)
+            elif attr == "d":
+                if self.dim == self.complex.complex_dimension():
+                    dtype = 'int8' if self.dim > 0 else 'uint8'
+                    self.d = sparse.csc_matrix((1,self.num_simplices), dtype=dtype)
+                else:
+                    self.d = self.complex[self.dim + 1].boundary.T
+                return self.d
+            elif attr in ["star_diag", "star_inv_diag"]:
+                self.complex.construct_hodge(self.dim)
+                return getattr(self, attr)
             elif attr == "star":
-                self.complex.construct_hodge()
+                self.star = _diagonal_matrix(self.star_diag)
                 return self.star
             elif attr == "star_inv":
-                self.complex.construct_hodge()
+                self.star_inv = _diagonal_matrix(self.star_inv_diag)
                 return self.star_inv
             elif attr == "circumcenter":
                 self.complex.compute_circumcenters(self.dim)
@@ -310,13 +577,35 @@ class simplicial_complex(list):
             elif attr == "bary_circumcenter":
                 self.complex.compute_bary_circumcenters(self.dim)
                 return self.bary_circumcenter
+            elif attr == "barycentric_gradients":
+                self.complex.compute_barycentric_gradients(self.dim)
+                return self.barycentric_gradients
+            elif attr == "whitney_pattern":
+                # CSR pattern of the Whitney form mass matrix
+                self.whitney_pattern = pydec.fem.innerproduct.massmatrix_pattern(self.complex, self.dim)
+                return self.whitney_pattern
             elif attr == "primal_volume":
                 self.complex.compute_primal_volume(self.dim)
                 return self.primal_volume
             elif attr == "dual_volume":
-                self.complex.compute_dual_volume()
+                self.complex.compute_dual_volume(self.dim)
                 return self.dual_volume
+            elif attr in ["simplex_order", "simplex_keys", "simplex_key_base"]:
+                # sorted simplex keys and the permutation to lexicographical 
+                # order, when required
+                base = int(self.simplices.max()) + 1 if self.simplices.size > 0 else 1
+                keys = simplex_key(self.simplices, base)
+                order = keys.argsort(kind='stable')
+                if (order == numpy.arange(len(order))).all():
+                    self.simplex_order = None
+                else:
+                    self.simplex_order = order
+                    keys = keys[order]
+                self.simplex_keys = keys
+                self.simplex_key_base = base
+                return getattr(self, attr)
             elif attr == "simplex_to_index":
+                # dictionary interface, see simplex_lookup() for bulk queries
                 self.simplex_to_index = dict((simplex(x), i) for i, x in enumerate(self.simplices))
                 return self.simplex_to_index
             elif attr == "index_to_simplex":
@@ -326,5 +615,13 @@ class simplicial_complex(list):
                 raise AttributeError(attr + " not found")
     
 
+def _diagonal_matrix(diagonal):
+    # CSR matrix with an explicit full diagonal which shares its data 
+    # with the given array
+    N = len(diagonal)
+    indptr = arange(N + 1)
+    return sparse.csr_matrix((diagonal, indptr[:-1], indptr), shape=(N,N))
+
+
 #for backwards compatibility
 SimplicialComplex = simplicial_complex
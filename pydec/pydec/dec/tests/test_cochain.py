@@ -1,9 +1,11 @@
 from pydec.testing import *
 
 from scipy import array, alltrue, array, sqrt, sparse
+from numpy import arange, vstack, hstack, zeros_like, meshgrid, result_type
 
 from pydec.dec import simplicial_complex
-from pydec.dec.cochain import d, laplace_beltrami, laplace_derham, star
+from pydec.dec.cochain import d, delta, laplace_beltrami, laplace_derham, star, \
+     cochain_block, set_num_threads, get_num_threads
 from pydec.mesh.simplex import simplex
 
 
@@ -62,6 +64,16 @@ def test_get_set():
     assert_equal(c0[0],10)
     assert_equal(c0[1],20)
     assert_equal(c0[2],-30)
+
+def test_get_set_missing():
+    V = array([[0,0],[1,0],[1,1],[0,1]]) 
+    S = array([[0,1,2],[0,2,3]]) 
+    sc = simplicial_complex((V,S))
+    
+    c1 = sc.get_cochain(1)
+    assert_raises(KeyError, c1.__getitem__, simplex([1,3]))
+    assert_raises(KeyError, c1.__setitem__, simplex([1,3]), 1.0)
+    assert_equal(c1.v, zeros_like(c1.v))
         
         
 class TestCochainFunctions(TestCase):
@@ -98,7 +110,195 @@ class TestCochainFunctions(TestCase):
                 result   = star(star(sc.get_cochain_basis(p))).v
                 expected = (-1)**(p*(N - p)) * sparse.identity(sc[p].num_simplices)
                 assert_almost_equal(result.todense(),expected.todense())
+
+
+    def test_star_dense(self):
+        """Dense values are scaled by the diagonal of the star"""
+        for case in all_cases:
+            sc = simplicial_complex(case)
+            N  = sc.complex_dimension()
+            for p in range(N + 1):
+                for is_primal in [True,False]:
+                    basis = sc.get_cochain_basis(p, is_primal)
+                    f = sc.get_cochain(p, is_primal)
+                    f.v = arange(1, len(f.v) + 1, dtype=float)
+                    assert_equal(star(f).v, star(basis).v * f.v)
+
+                    f.v = vstack((f.v,-2*f.v)).T
+                    assert_equal(star(f).v, star(basis).v * f.v)
+        
+        
+    def test_operator(self):
+        """Matrix-free operators agree with the assembled ones"""
+        for case in all_cases:
+            sc = simplicial_complex(case)
+            N  = sc.complex_dimension()
+            if not all((sc[p].dual_volume > 0).all() for p in range(N + 1)): continue #skip non-wellcentered
+            for p in range(N + 1):
+                for is_primal in [True,False]:
+                    for op in [d, star, delta, laplace_beltrami, laplace_derham]:
+                        expected = op(sc.get_cochain_basis(p, is_primal)).v
+                        result   = op(sc.get_cochain_operator(p, is_primal)).v
+                        assert_equal(result.shape, expected.shape)
+
+                        x = arange(1, expected.shape[1] + 1, dtype=float)
+                        assert_almost_equal(result.matvec(x), expected * x)
+
+                        X = vstack((x,x**2)).T
+                        assert_almost_equal(result.matmat(X), expected * X)
+
+        
+    def test_block(self):
+        """Operations on cochain blocks agree with those on each cochain"""
+        for case in all_cases:
+            sc = simplicial_complex(case)
+            N  = sc.complex_dimension()
+            for p in range(N + 1):
+                for is_primal in [True,False]:
+                    block = sc.get_cochain_block(p, 3, is_primal)
+                    block.v[:] = arange(block.v.size).reshape(block.v.shape)
+
+                    for op in [d, star, delta, laplace_beltrami, laplace_derham]:
+                        result = op(block)
+                        assert(isinstance(result, cochain_block))
+                        assert(result.v.flags.c_contiguous)
+
+                        for i in range(3):
+                            f = sc.get_cochain(p, is_primal)
+                            f.v[:] = block.v[:,i]
+                            assert_equal(result.v[:,i], op(f).v)
+
+                    chunks = list(block.chunks(2))
+                    assert_equal([c.num_cochains() for c in chunks], [2,1])
+                    assert_equal(hstack([c.v for c in chunks]), block.v)
+
         
+    def test_out(self):
+        """Operations with out arguments agree with those without"""
+        for case in all_cases:
+            sc = simplicial_complex(case)
+            N  = sc.complex_dimension()
+            for p in range(N + 1):
+                for is_primal in [True,False]:
+                    for shape in [(),(2,)]:
+                        f = sc.get_cochain(p, is_primal)
+                        M = len(f.v)
+                        f.v = arange(1, M * max(shape + (1,)) + 1, dtype=float).reshape((M,) + shape)
+
+                        for op,k,dual in [(d,p + 1,False),(star,N - p,True),(delta,p - 1,False),
+                                          (laplace_beltrami,p,False),(laplace_derham,p,False)]:
+                            expected = op(f)
+                            out = sc.get_cochain(k, is_primal != dual) if 0 <= k <= N else \
+                                  expected.__class__(sc, k, is_primal != dual)
+                            out.v = zeros_like(expected.v)
+                            buffer = out.v
+
+                            result = op(f, out=out)
+                            assert(result is out)
+                            assert(result.v is buffer)
+                            assert_equal(result.v, expected.v)
+
+                            # buffers are reused
+                            result = op(f, out=out)
+                            assert_equal(result.v, expected.v)
+
+                        self.assertRaises(ValueError, d, f, sc.get_cochain(p, not is_primal))
+
+        # in-place arithmetic
+        sc = simplicial_complex(all_cases[2])
+        f,g = sc.get_cochain(1),sc.get_cochain(1)
+        f.v[:] = [1,2,3]
+        g.v[:] = [4,5,6]
+        values = f.v
+        f += g
+        f -= g
+        f += g
+        assert(f.v is values)
+        assert_equal(f.v, [5,7,9])
+
+    def test_out_allocation(self):
+        """A steady state time step does not allocate arrays"""
+        from tracemalloc import start, stop, get_traced_memory
+        from scipy.spatial import Delaunay
+        
+        # equilateral triangles
+        x,y = meshgrid(arange(40.0),arange(40.0))
+        x += 0.5*(y % 2)
+        y *= sqrt(3)/2
+        vertices = vstack((x.ravel(),y.ravel())).T
+        sc = simplicial_complex((vertices,Delaunay(vertices).simplices))
+
+        u = sc.get_cochain(1)
+        u.v[:] = arange(len(u.v))
+        Lu = sc.get_cochain(1)
+
+        for i in range(2):
+            if i == 1: start()
+            laplace_derham(u, out=Lu)
+            Lu.v *= 1e-3
+            u -= Lu
+            if i == 1:
+                peak = get_traced_memory()[1]
+                stop()
+
+        assert(peak < u.v.nbytes)
+
+        
+    def test_threads(self):
+        """Threaded application gives the same results as the serial one"""
+        import sys
+        module = sys.modules['pydec.dec.cochain']
+        threshold = module._parallel_threshold
+
+        case = all_cases[4]
+        sc = simplicial_complex(case)
+        N  = sc.complex_dimension()
+
+        ops = [d, star, delta, laplace_beltrami, laplace_derham]
+
+        for p in range(N + 1):
+            for is_primal in [True,False]:
+                for m in [None,3]:
+                    if m is None:
+                        f = sc.get_cochain(p, is_primal)
+                    else:
+                        f = sc.get_cochain_block(p, m, is_primal)
+                    f.v[:] = (arange(f.v.size) % 7).reshape(f.v.shape) + 0.5
+
+                    expected = [op(f).v for op in ops]
+
+                    try:
+                        module._parallel_threshold = 0
+                        set_num_threads(3)
+                        assert_equal(get_num_threads(), 3)
+                        for op,e in zip(ops,expected):
+                            assert_equal(op(f).v, e)
+                            out = op(f)
+                            out.v[:] = 0
+                            assert_equal(op(f, out=out).v, e)
+                    finally:
+                        module._parallel_threshold = threshold
+                        set_num_threads(1)
+
+        self.assertRaises(ValueError, set_num_threads, 0)
+
+    def test_value_types(self):
+        """Dense values of any type are multiplied by the sparse operators"""
+        sc = simplicial_complex(all_cases[4])
+        for p in range(2):
+            for is_primal in [True,False]:
+                f = sc.get_cochain(p, is_primal)
+                B = sc.get_cochain_basis(p, is_primal)
+                for dtype in ['int32','float32','float64','complex128']:
+                    f.v = (arange(len(f.v)) % 5).astype(dtype)
+                    df = d(f)
+                    assert_equal(df.v.dtype, result_type(sc[p].d.dtype, dtype))
+                    assert_equal(df.v, d(B).v * f.v)
+
+                    out = d(f)
+                    out.v[:] = 0
+                    assert_equal(d(f, out=out).v, df.v)
+
         
     def test_delta(self):    
         pass
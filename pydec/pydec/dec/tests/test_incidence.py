@@ -0,0 +1,73 @@
+from numpy.testing import TestCase, assert_equal, assert_almost_equal
+
+from numpy import array, random
+from scipy import sparse
+from scipy.spatial import Delaunay
+
+from pydec.dec import simplicial_complex
+from pydec.dec.incidence import incidence_table, incidence_gather, incidence_scatter
+from pydec.dec.cochain import d, set_incidence_kernels, get_incidence_kernels
+from pydec.dec.cube_array import cube_array_boundary
+
+
+class TestIncidence(TestCase):
+    def setUp(self):
+        random.seed(0)
+
+    def test_table(self):
+        B = sparse.csr_matrix([[-1,0],[1,-1],[0,1]])
+        faces,signs = incidence_table(B)
+        assert_equal(faces,[[0,1],[1,2]])
+        assert_equal(signs,[[-1,1],[-1,1]])
+
+        #columns with different numbers of nonzeros
+        B = sparse.csr_matrix([[-1,0],[1,-1],[0,0]])
+        self.assertRaises(ValueError, incidence_table, B)
+
+    def test_kernels(self):
+        vertices = random.rand(40,3)
+        sc = simplicial_complex((vertices,Delaunay(vertices).simplices))
+
+        for k in range(1,4):
+            B = sc[k].boundary
+            faces,signs = sc[k].face_indices,sc[k].face_signs
+            assert_equal(faces.shape,(sc[k].num_simplices,k+1))
+
+            x = random.rand(B.shape[0])
+            assert_almost_equal(incidence_gather(faces,signs,x), sc[k-1].d * x)
+            x = random.rand(B.shape[0],3)
+            assert_almost_equal(incidence_gather(faces,signs,x), sc[k-1].d * x)
+
+            y = random.rand(B.shape[1])
+            assert_almost_equal(incidence_scatter(faces,signs,y,B.shape[0]), B * y)
+            y = random.rand(B.shape[1],3)
+            assert_almost_equal(incidence_scatter(faces,signs,y,B.shape[0]), B * y)
+
+        assert_equal(sc[0].face_indices.shape,(sc[0].num_simplices,0))
+
+    def test_cochains(self):
+        vertices = random.rand(40,3)
+        sc = simplicial_complex((vertices,Delaunay(vertices).simplices))
+
+        assert_equal(get_incidence_kernels(), False)
+        for k in range(4):
+            for is_primal in [True,False]:
+                f = sc.get_cochain_block(k, 2, is_primal)
+                f.v[:] = random.rand(*f.v.shape)
+                expected = d(f).v
+                try:
+                    set_incidence_kernels(True)
+                    assert_equal(get_incidence_kernels(), True)
+                    assert_almost_equal(d(f).v, expected)
+                    out = d(f)
+                    out.v[...] = 0
+                    assert_almost_equal(d(f, out=out).v, expected)
+                finally:
+                    set_incidence_kernels(False)
+
+    def test_cubes(self):
+        #k-cubes have 2*k faces
+        cubes = array([[0,0,0,1],[1,0,0,1],[0,1,0,1]])
+        faces,B = cube_array_boundary(cubes,2)
+        table = incidence_table(B)[0]
+        assert_equal(table.shape,(3,4))
@@ -0,0 +1,99 @@
+from numpy.testing import TestCase, assert_equal, assert_almost_equal
+
+from numpy import array
+from scipy import sparse
+
+from pydec.dec import simplicial_complex, operator_cache
+from pydec.dec.cochain import d, delta, laplace_beltrami, laplace_derham
+
+
+class TestOperatorCache(TestCase):
+    def setUp(self):
+        v = array([[0,0],[1,0],[1,1],[0,1],[0.5,0.5]])
+        s = array([[0,1,4],[1,2,4],[2,3,4],[0,4,3]])
+        self.sc = simplicial_complex((v,s))
+
+    def test_operators(self):
+        sc = self.sc
+        for name,op in [('d',d),('delta',delta),('laplace_beltrami',laplace_beltrami),
+                        ('laplace_derham',laplace_derham)]:
+            for k in range(3):
+                for is_primal in [True,False]:
+                    A = sc.operator_cache.get(name, k, is_primal)
+                    expected = op(sc.get_cochain_basis(k, is_primal)).v
+                    assert_almost_equal(A.todense(), expected.todense())
+                    assert(A is sc.operator_cache.get(name, k, is_primal))
+
+        self.assertRaises(ValueError, sc.operator_cache.get, 'grad', 0)
+
+    def test_eviction(self):
+        cache = operator_cache(self.sc, max_bytes=None)
+        cache.get('laplace_beltrami', 0)
+        cache.get('laplace_beltrami', 1)
+        nbytes = cache.nbytes
+
+        # room for both operators, least recently used is evicted first
+        cache = operator_cache(self.sc, max_bytes=nbytes)
+        cache.get('laplace_beltrami', 0)
+        cache.get('laplace_beltrami', 1)
+        cache.get('laplace_beltrami', 0)
+        cache.get('d', 1)
+        assert(('laplace_beltrami', 0, True) in cache)
+        assert(('laplace_beltrami', 1, True) not in cache)
+        assert(cache.nbytes <= nbytes)
+
+        # operators larger than the budget are not kept
+        cache = operator_cache(self.sc, max_bytes=0)
+        cache.get('laplace_beltrami', 1)
+        assert_equal(len(cache), 0)
+        assert_equal(cache.nbytes, 0)
+
+    def test_converted(self):
+        sc = self.sc
+        A = sc[1].d
+        B = sc.operator_cache.converted(('d',1), A, float)
+        assert(sparse.isspmatrix_csr(B))
+        assert_equal(B.dtype, float)
+        assert_equal(B.todense(), A.todense())
+        assert(B is sc.operator_cache.converted(('d',1), A, B.dtype))
+
+        # a different matrix under the same name replaces the copy
+        C = sc.operator_cache.converted(('d',1), -A, float)
+        assert_equal(C.todense(), -A.todense())
+        assert_equal(len(sc.operator_cache), 1)
+
+        # copies count towards the memory budget
+        cache = operator_cache(sc, max_bytes=0)
+        cache.converted(('d',1), A, float)
+        assert_equal(len(cache), 0)
+        assert_equal(cache.nbytes, 0)
+
+    def test_cochain_products(self):
+        sc = self.sc
+        f = sc.get_cochain(0)
+        f.v[:] = 1.0
+        d(f)
+        assert(('converted', ('d',0), f.v.dtype) in sc.operator_cache)
+
+        # operators built for out of range dimensions are not cached
+        f = sc.get_cochain(0, is_primal=False)
+        f.k = 4
+        f.v = array([1.0j])
+        d(f)
+        assert_equal(len(sc.operator_cache), 1)
+
+    def test_update_vertices(self):
+        sc = self.sc
+        D = sc.operator_cache.get('d', 0)
+        L = sc.operator_cache.get('laplace_beltrami', 0)
+
+        v = sc.vertices.copy()
+        v[4] = [0.4,0.6]
+        sc.update_vertices(v)
+
+        assert(sc.operator_cache.get('d', 0) is D)
+        assert(sc.operator_cache.get('laplace_beltrami', 0) is not L)
+
+        expected = simplicial_complex((v,sc.simplices))
+        assert_almost_equal(sc.operator_cache.get('laplace_beltrami', 0).todense(),
+                            laplace_beltrami(expected.get_cochain_basis(0)).v.todense())
@@ -1,9 +1,11 @@
 from pydec.testing import *
 
 from scipy import random,arange,alltrue,array
+from numpy import lexsort
 
 from pydec.dec.simplex_array import simplex_array_boundary, \
-     simplex_array_parity, simplex_array_searchsorted
+     simplex_array_parity, simplex_array_searchsorted, simplex_array_lookup, \
+     simplex_key
 from pydec.math.parity import relative_parity
 
 
@@ -50,6 +52,91 @@ class TestSearchsorted(TestCase):
                 
 
 
+
+class TestLookup(TestCase):
+    def setUp(self):
+        random.seed(0)
+
+
+    def test_simple(self):
+        s = array([[0,1],[0,2],[1,2],[1,3],[1,4],[3,4]])
+        v = array([[2,1],[0,2],[4,3],[4,1]])
+
+        indices,parity = simplex_array_lookup(s,v)
+
+        assert_equal(indices,array([2,1,5,4]))
+        assert_equal(parity,array([1,0,1,1]))
+
+
+    def test_order(self):
+        s = array([[1,3],[0,2],[3,4],[0,1]])
+        v = array([[0,1],[3,1],[2,0],[3,4]])
+        order = array([3,1,0,2])
+
+        indices,parity = simplex_array_lookup(s,v,order)
+
+        assert_equal(indices,array([3,0,1,2]))
+        assert_equal(parity,array([0,1,1,0]))
+
+
+    def test_missing(self):
+        s = array([[0,1],[0,2],[1,2]])
+
+        self.assertRaises(ValueError, simplex_array_lookup, s, array([[1,3]]))
+        self.assertRaises(ValueError, simplex_array_lookup, s, array([[2,3]]))
+        self.assertRaises(ValueError, simplex_array_lookup, s[:0], array([[0,1]]))
+
+
+    def test_random(self):
+        for n_row in [1,2,3,10,100,200]:
+            for n_col in [1,2,3,4,5]:
+                s = arange(n_row*n_col).reshape((n_row,n_col))
+                order = random.permutation(n_row)
+                s = s[order]
+
+                for n_searches in [1,2,3,n_row,2*n_row]:
+                    expected = random.randint(0,n_row,n_searches)
+
+                    v = s[expected,:].copy()
+                    for row in v:
+                        random.shuffle(row)
+
+                    indices,parity = simplex_array_lookup(s,v,order.argsort())
+
+                    assert_equal(indices,expected)
+                    assert_equal(parity,simplex_array_parity(v))
+
+
+
+class TestKey(TestCase):
+    def setUp(self):
+        random.seed(0)
+
+
+    def test_simple(self):
+        s = array([[0,1],[0,2],[1,2],[1,3]])
+
+        assert_equal(simplex_key(s),array([1,2,6,7]))
+        assert_equal(simplex_key(s,10),array([1,2,12,13]))
+
+
+    def test_order(self):
+        """keys sort like the rows of s, with and without packing overflow"""
+        for num_vertices in [2,10,1000,2**40]:
+            for n_col in [1,2,3,4,5]:
+                s = random.randint(0,min(num_vertices,20),(100,n_col))
+                if num_vertices > 20:
+                    s = s*(num_vertices//20)
+
+                keys = simplex_key(s,num_vertices)
+
+                expected = lexsort(s.T[::-1])
+                assert_equal(s[keys.argsort(kind='stable')],s[expected])
+
+                # equal keys iff equal rows
+                same = keys[:,None] == keys[None,:]
+                assert_equal(same,(s[:,None,:] == s[None,:,:]).all(axis=2))
+
          
 class test_simplex_array_parity(TestCase):
     def setUp(self):
@@ -1,6 +1,7 @@
 from pydec.testing import *
 
 from scipy import random, rand, concatenate, zeros, sparse, matrix, sqrt
+from scipy.special import comb
 
 from pydec.dec import simplicial_complex
 from pydec.mesh.simplex import simplex
@@ -280,6 +281,104 @@ class TestSimplicialComplex(TestCase):
         assert_equal(sc[2].d[1,face124], 1)
         assert_equal(sc[2].d[1,face123],-1)
 
+
+    def test_simplex_lookup(self):
+        v,e = matrix([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]]),matrix([[0,1,2,3],[4,3,2,1]])
+        sc  = simplicial_complex((v,e))
+
+        for dim in range(sc.complex_dimension() + 1):
+            data = sc[dim]
+            indices,parity = data.simplex_lookup(data.simplices[::-1])
+            assert_equal(indices, range(data.num_simplices)[::-1])
+            assert_equal(parity, data.simplex_parity[::-1])
+
+        #lookup of the top simplices as given
+        indices,parity = sc[3].simplex_lookup([[0,1,2,3],[4,3,2,1],[1,0,2,3],[3,4,2,1]])
+        assert_equal(indices,[0,1,0,1])
+        assert_equal(parity,[0,0,1,1])
+
+        #consistency with the dictionary interface
+        for s in [(0,1),(3,1),(2,4),(2,1,4),(4,1,2,3)]:
+            indices,parity = sc[len(s) - 1].simplex_lookup([s])
+            assert_equal(indices[0], sc[len(s) - 1].simplex_to_index[simplex(s)])
+
+
+    def test_boundary_faces(self):
+        #two triangles
+        v,e = matrix([[0,0],[1,0],[1,1],[0,1]]),matrix([[0,1,3],[2,3,1]])
+        sc  = simplicial_complex((v,e))
+
+        indices,signs = sc.boundary_faces()
+        assert_equal(sc[1].simplices[indices],[[0,1],[0,3],[1,2],[2,3]])
+        assert_equal(signs,[1,-1,1,1])
+        assert_equal(sc.boundary(),[simplex(x) for x in [(0,1),(0,3),(1,2),(2,3)]])
+
+        #two tets sharing a face
+        v,e = matrix([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]]),matrix([[0,1,2,3],[2,1,3,4]])
+        sc  = simplicial_complex((v,e))
+
+        indices,signs,faces = sc.boundary_faces(closure=True)
+        assert_equal(len(indices),6)
+        assert_equal(sc[2].simplex_lookup([[1,2,3]])[0][0] in indices,False)
+        for f,sign in zip(sc[2].simplices[indices],signs):
+            #orientation induced by the top simplex containing the face
+            index = [set(f) <= set(t) for t in sc.simplices].index(True)
+            B = sc[3].boundary
+            assert_equal(B[sc[2].simplex_lookup([f])[0][0],index],sign)
+        assert_equal(faces[2],indices)
+        assert_equal(faces[1],range(9))
+        assert_equal(faces[0],range(5))
+
+
+    def test_dimensions(self):
+        v,e = matrix([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]]),matrix([[0,1,2,3],[2,1,3,4]])
+        full = simplicial_complex((v,e))
+
+        sc = simplicial_complex((v,e), dimensions=[2])
+        assert_equal('simplices' in vars(sc[2]), True)
+        assert_equal('simplices' in vars(sc[1]), False)
+
+        #levels below the requested dimensions are built on demand
+        assert_equal(sc[3].dual_volume, full[3].dual_volume)
+        assert_equal(sc[2].star.diagonal(), full[2].star.diagonal())
+        assert_equal('simplices' in vars(sc[1]), False)
+
+        for dim in [0,1,2,3]:
+            assert_equal(sc[dim].simplices,        full[dim].simplices)
+            assert_equal(sc[dim].simplex_parity,   full[dim].simplex_parity)
+            assert_equal(sc[dim].boundary.todense(), full[dim].boundary.todense())
+            assert_equal(sc[dim].d.todense(),        full[dim].d.todense())
+            assert_equal(sc[dim].dual_volume,      full[dim].dual_volume)
+
+        self.assertRaises(ValueError, simplicial_complex, (v,e), dimensions=[4])
+
+
+    def test_update_vertices(self):
+        random.seed(0)
+        v,e = matrix([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]]),matrix([[0,1,2,3],[2,1,3,4]])
+        sc  = simplicial_complex((v,e))
+
+        star = sc[1].star
+        d    = sc[1].d
+        sc[2].circumcenter
+
+        moved = v + 0.1*rand(*v.shape)
+        sc.update_vertices(moved)
+        expected = simplicial_complex((moved,e))
+
+        #topology and star operators are kept
+        assert(sc[1].d is d)
+        assert(sc[1].star is star)
+
+        for dim in range(4):
+            assert_almost_equal(sc[dim].primal_volume, expected[dim].primal_volume)
+            assert_almost_equal(sc[dim].dual_volume,   expected[dim].dual_volume)
+            assert_almost_equal(sc[dim].circumcenter,  expected[dim].circumcenter)
+            assert_almost_equal(sc[dim].star.todense(),     expected[dim].star.todense())
+            assert_almost_equal(sc[dim].star_inv.todense(), expected[dim].star_inv.todense())
+
+        self.assertRaises(ValueError, sc.update_vertices, moved[:-1])
+
                                
     def test_hodge_star(self):
         """Test the hodge * operator"""
@@ -354,4 +453,28 @@ class TestSimplicialComplex(TestCase):
                 k = dim
                 assert_almost_equal((data.star * data.star_inv).todense(), \
                                     ((-1)**(k*(n-k))*sparse.identity(data.num_simplices)).todense())
-    
+
+    def test_dual_volume(self):
+        """Signed dual volumes of non well-centered complexes
+
+        The pieces |s| |*s| of the k-simplices s tile the complex 
+        (n choose k) times, with signs
+        """
+        cases = []
+        #obtuse triangle
+        cases.append((matrix([[2,0.5],[0,0],[4,0]]),matrix([[0,1,2]])))
+        #obtuse triangle and its neighbor
+        cases.append((matrix([[2,0.5],[0,0],[4,0],[2,-3]]),matrix([[0,1,2],[1,3,2]])))
+        #flat tet and its neighbor
+        cases.append((matrix([[0,0,0],[4,0,0],[0,4,0],[1,1,0.2],[1,1,-3]]),
+                      matrix([[0,1,2,3],[0,2,1,4]])))
+
+        for v,e in cases:
+            sc = simplicial_complex((v,e))
+            n  = sc.complex_dimension()
+            total_volume = abs(sc[n].primal_volume).sum()
+            for k in range(n):
+                data = sc[k]
+                assert_almost_equal((data.primal_volume * data.dual_volume).sum(),
+                                    comb(n,k) * total_volume)
+
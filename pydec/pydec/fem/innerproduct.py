@@ -1,23 +1,33 @@
 
-__all__ = ['barycentric_gradients','whitney_innerproduct','regular_cube_innerproduct']
+__all__ = ['barycentric_gradients','barycentric_gradients_array','whitney_innerproduct',
+           'whitney_stiffness','whitney_lumped_innerproduct','whitney_mass_operator',
+           'regular_cube_innerproduct']
 
-from numpy import matrix,zeros,ones,eye,allclose, \
-                isreal,real,dot,concatenate,sqrt, \
+from numpy import zeros,ones,dot,concatenate, \
                 arange,array,inner,vstack,atleast_2d,empty,tile, \
-                asarray,all,sum,hstack
-from scipy import sparse
-
-from scipy.special import factorial, comb
-from scipy.linalg import det,inv
-from scipy.sparse import coo_matrix
+                asarray,unique,bincount,cumsum,array_equal,absolute
+
+from scipy.special import factorial
+from scipy.linalg import inv
+from numpy.linalg import det as stacked_det
+from scipy.sparse import coo_matrix,csr_matrix,isspmatrix_csr
+from scipy.sparse.linalg import LinearOperator
+from functools import lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
               
-from pydec.mesh import simplex
 from pydec.math.combinatorial import combinations
-from pydec.dec.simplex_array import simplex_array_searchsorted
-from pydec.dec.cube_array import cube_array_search,cube_array_boundary
+from pydec.dec.simplex_array import simplex_array_searchsorted, simplex_key
+from pydec.dec.cube_array import cube_array_boundary
 
 import scipy,numpy
 
+# number of simplices processed at once by whitney_innerproduct
+whitney_chunk_size = 2**14
+
+# number of cubes processed at once by regular_cube_innerproduct
+cube_chunk_size = 2**16
 
 def barycentric_gradients(pts):
     """
@@ -32,142 +42,797 @@ def barycentric_gradients(pts):
     return vstack((atleast_2d(-numpy.sum(grads,axis=0)),grads))
 
 
-def massmatrix_rowcols(complex,k):
+def barycentric_gradients_array(pts):
     """
-    Compute the row and column arrays in the COO
-    format of the Whitney form mass matrix
+    Compute the gradients of the barycentric basis functions over an array of simplices
+
+    Parameters
+    ----------
+    pts : array
+        Array with shape (N,p+1,D) containing the vertices of N p-simplices
+        embedded in D dimensions, where D >= p
+
+    Returns
+    -------
+    grads : array
+        Array with shape (N,p+1,D), where grads[i,j] is the gradient of the
+        barycentric basis function of the j-th vertex of the i-th simplex.
+        When D > p the gradients lie in the tangent space of each simplex.
+
+    Examples
+    --------
+    >>> barycentric_gradients_array([[[0,0],[1,0],[0,1]]])
+    array([[[-1., -1.],
+            [ 1.,  0.],
+            [ 0.,  1.]]])
+
+    See Also
+    --------
+    barycentric_gradients
+
     """
+    pts = asarray(pts, dtype=float)
+
+    V = pts[:,1:] - pts[:,:1]
+
+    ##all gradients except the first are computed with stacked solves
+    grads = numpy.linalg.solve(numpy.matmul(V, V.swapaxes(-1,-2)), V)
+
+    ##since sum of all gradients is zero, simply compute the first from the others
+    return concatenate((-grads.sum(axis=1,keepdims=True), grads), axis=1)
+
+
+@lru_cache(maxsize=None)
+def _whitney_tables(p,k):
+    """
+    Local tables for the Whitney k-form mass matrix of a p-simplex
+
+    These depend only on (p,k) and are shared by all calls, so the
+    returned arrays are read-only.
+
+    Returns
+    -------
+    k_faces : array
+        The local k-faces of a p-simplex, one per row
+    face_pairs : array
+        face_pairs[n] = (i,j) is the pair of local k-faces of the n-th
+        entry of the local mass matrix, in row-major order
+    k_form_pairs_array : array or None
+        Pairs of local (k-1)-faces whose gradient determinants are
+        needed, or None when k is 0
+    dets_to_vals : csr_matrix
+        Maps flat vector of determinants to the flattened matrix entries
+    """
+    k_forms = [tuple(x) for x in combinations(range(p+1),k)]
+    k_faces = [tuple(x) for x in combinations(range(p+1),k+1)]
+
+    num_k_faces = len(k_faces)
+
+    k_form_pairs = [tuple(x) for x in combinations(k_forms,2)] + [(x,x) for x in k_forms]
+    num_k_form_pairs = len(k_form_pairs)
+    k_form_pairs_to_index = dict(zip(k_form_pairs,range(num_k_form_pairs)))
+    k_form_pairs_to_index.update(zip([x[::-1] for x in k_form_pairs],range(num_k_form_pairs)))
+    num_k_face_pairs = num_k_faces**2
+
+    #maps flat vector of determinants to the flattened matrix entries
+    dets_to_vals = scipy.sparse.lil_matrix((num_k_face_pairs,num_k_form_pairs))
+
+    face_pairs = []
+    for i,face1 in enumerate(k_faces):
+        for j,face2 in enumerate(k_faces):
+            row_index = len(face_pairs)
+
+            face_pairs.append((i,j))
+
+            for n in range(k+1):
+               for m in range(k+1):
+                   form1 = face1[:n] + face1[n+1:]
+                   form2 = face2[:m] + face2[m+1:]
+
+                   col_index = k_form_pairs_to_index[(form1,form2)]
+
+                   dets_to_vals[row_index,col_index] += (-1)**(n+m)*((face1[n] == face2[m]) + 1)                 
+
+    k_faces = array(k_faces,dtype=int).reshape((num_k_faces,k+1))
+    k_faces.setflags(write=False)
+
+    face_pairs = array(face_pairs,dtype=int)
+    face_pairs.setflags(write=False)
+
+    if k > 0:
+        k_form_pairs_array = array(k_form_pairs)
+        k_form_pairs_array.setflags(write=False)
+    else:
+        k_form_pairs_array = None
+
+    return k_faces,face_pairs,k_form_pairs_array,dets_to_vals.tocsr()
+
+
+@lru_cache(maxsize=None)
+def _local_derivative(p,k):
+    """
+    Exterior derivative of k-forms on a single p-simplex
+
+    Returns a read-only array D, where D[i,j] is the sign with which
+    the j-th local k-face appears in the boundary of the i-th local
+    (k+1)-face, in the orderings of _whitney_tables.
+    """
+    k_faces  = [tuple(x) for x in _whitney_tables(p,k)[0]]
+    k1_faces = [tuple(x) for x in _whitney_tables(p,k+1)[0]]
+
+    k_face_to_index = dict(zip(k_faces,range(len(k_faces))))
+
+    D = zeros((len(k1_faces),len(k_faces)))
+    for i,face in enumerate(k1_faces):
+        for n in range(k+2):
+            D[i,k_face_to_index[face[:n] + face[n+1:]]] = (-1)**n
+
+    D.setflags(write=False)
+
+    return D
+
+
+def _local_face_indices(complex,k):
+    ## indices[n,i] is the index in complex[k] of the i-th local k-face
+    ## of the n-th top simplex
     simplices = complex[-1].simplices
-    num_simplices = simplices.shape[0]
     p = complex.complex_dimension()
-    
+
     if k == p:
         #top dimension
-        rows = arange(num_simplices,dtype=simplices.dtype)
-        cols = arange(num_simplices,dtype=simplices.dtype)
-        return rows,cols
-    
-    k_faces = [tuple(x) for x in combinations(range(p+1),k+1)]
+        return arange(simplices.shape[0],dtype=simplices.dtype).reshape((-1,1))
 
-    faces_per_simplex = len(k_faces)
-    num_faces = num_simplices*faces_per_simplex
-    faces     = empty((num_faces,k+1),dtype=simplices.dtype)
-   
-    for n,face in enumerate(k_faces):
-        for m,i in enumerate(face):
-            faces[n::faces_per_simplex,m] = simplices[:,i]
+    k_faces = _whitney_tables(p,k)[0]
+
+    #faces[n*faces_per_simplex + i] is the i-th local k-face of the n-th simplex
+    faces = simplices[:,k_faces].reshape((-1,k+1))
 
     #faces.sort() #we can't assume that the p-simplices are sorted
 
     indices = simplex_array_searchsorted(complex[k].simplices,faces)
+    return indices.reshape((-1,len(k_faces)))
 
-    rows = tile(indices.reshape((-1,1)),(faces_per_simplex,)).flatten()
-    cols = tile(indices.reshape((-1,faces_per_simplex)),(faces_per_simplex,)).flatten()
+
+def massmatrix_rowcols(complex,k):
+    """
+    Compute the row and column arrays in the COO
+    format of the Whitney form mass matrix
+    """
+    p = complex.complex_dimension()
+
+    indices = _local_face_indices(complex,k)
+    face_pairs = _whitney_tables(p,k)[1]
+
+    rows = indices[:,face_pairs[:,0]].flatten()
+    cols = indices[:,face_pairs[:,1]].flatten()
 
     return rows,cols
 
 
 
-def whitney_innerproduct(complex,k):
+def massmatrix_pattern(complex,k):
     """
-    For a given SimplicialComplex, compute a matrix representing the 
-    innerproduct of Whitney k-forms
+    Compute the CSR sparsity pattern of the Whitney form mass matrix
+
+    The pattern only depends on the topology of the complex.  It is
+    cached as complex[k].whitney_pattern and reused by every call to
+    whitney_innerproduct.
+
+    Returns
+    -------
+    indptr, indices : arrays
+        Row pointers and (sorted) column indices of the CSR matrix
+    scatter : array
+        scatter[n] is the position in the CSR data array of the n-th
+        entry of the COO arrays returned by massmatrix_rowcols
     """
-    assert(k >= 0 and k <= complex.complex_dimension())    
-        
-    ## MASS MATRIX COO DATA
     rows,cols = massmatrix_rowcols(complex,k)
-    data = empty(rows.shape)
+    num_rows = complex[k].num_simplices
 
+    keys = rows.astype('int64') * num_rows + cols
+    keys,scatter = unique(keys, return_inverse=True)
 
-    ## PRECOMPUTATION
+    indices = keys % num_rows
+    indptr  = zeros(num_rows + 1, dtype=indices.dtype)
+    cumsum(bincount(keys // num_rows, minlength=num_rows), out=indptr[1:])
+
+    return indptr,indices,scatter
+
+
+
+def _whitney_scales(complex,k):
+    ## scale by the volume, barycentric weights, and account for the p! in each whitney form
     p = complex.complex_dimension()
-   
     scale_integration = (factorial(k)**2)/((p + 2)*(p + 1))   
-    
-    k_forms = [tuple(x) for x in combinations(range(p+1),k)]
-    k_faces = [tuple(x) for x in combinations(range(p+1),k+1)]
+    # primal volumes are signed when the top simplices are embedded in a 
+    # space of the same dimension, and negative for those with reversed
+    # orientation, while the integrals are over their unsigned volumes
+    return absolute(complex[-1].primal_volume) * scale_integration
 
-    num_k_forms = len(k_forms)
-    num_k_faces = len(k_faces)
 
-    k_form_pairs = [tuple(x) for x in combinations(k_forms,2)] + [(x,x) for x in k_forms]
-    num_k_form_pairs = len(k_form_pairs)
-    k_form_pairs_to_index = dict(zip(k_form_pairs,range(num_k_form_pairs)))
-    k_form_pairs_to_index.update(zip([x[::-1] for x in k_form_pairs],range(num_k_form_pairs)))
-    num_k_face_pairs = num_k_faces**2
+def _whitney_coefficients(complex,coefficients):
+    ## split coefficients into arrays of per-simplex scalars and tensors
+    if coefficients is None:
+        return None,None
+
+    coefficients = asarray(coefficients, dtype=float)
 
+    N = complex[-1].num_simplices
+    D = complex.embedding_dimension()
+
+    if coefficients.shape in [(),(N,)]:
+        return numpy.broadcast_to(coefficients,(N,)),None
+    elif coefficients.shape in [(D,D),(N,D,D)]:
+        return None,numpy.broadcast_to(coefficients,(N,D,D))
+    else:
+        raise ValueError('expected scalar coefficients with shape (%d,) or '
+                         'tensor coefficients with shape (%d,%d,%d)' % (N,N,D,D))
+
+
+def _whitney_chunks(num_simplices):
+    ## simplices are processed in chunks to bound the size of temporary arrays
+    return [(start,min(start + whitney_chunk_size, num_simplices))
+            for start in range(0, num_simplices, whitney_chunk_size)]
+
+
+def _whitney_weights(complex,k,coefficients=None):
+    ## scales of all top simplices, including scalar coefficients, and
+    ## tensor coefficients or None
+    scalars,tensors = _whitney_coefficients(complex,coefficients)
+
+    scales = _whitney_scales(complex,k)
+    if scalars is not None:
+        scales = scales * scalars
+
+    return scales,tensors
+
+
+def _local_mass_matrices(complex,k,start,stop,scales,tensors=None):
+    ## local Whitney k-form mass matrices of the top simplices start:stop,
+    ## given the weights of all top simplices from _whitney_weights
+    p = complex.complex_dimension()
+    F = len(_whitney_tables(p,k)[0])
+
+    scales = scales[start:stop]
+
+    local = empty((stop - start,F,F))
+    for a,b in _whitney_chunks(stop - start):
+        if k > 0:
+            d_lambda = complex[-1].barycentric_gradients[start + a:start + b]
+        else:
+            d_lambda = None
+        if tensors is not None:
+            T = tensors[start + a:start + b]
+        else:
+            T = None
+        _whitney_values(p, k, d_lambda, scales[a:b], local[a:b].reshape((b - a,-1)), T)
+
+    return local
+
+
+def _whitney_values(p,k,d_lambda,scales,out,tensors=None):
+    ## local mass matrices of a chunk of simplices, given the gradients 
+    ## of their barycentric basis functions, scaled volumes and optional
+    ## tensor coefficients
+    k_faces,face_pairs,k_form_pairs_array,dets_to_vals = _whitney_tables(p,k)
 
     if k > 0:
-        k_form_pairs_array = array(k_form_pairs)
+        # lambda_i denotes the scalar barycentric basis function of the i-th vertex of a simplex
+        # d(lambda_i) is the 1 form (gradient) of the i-th scalar basis function within the simplex
+        # dets[i,n] = det(dot(d_lambda[i,form1,:],d_lambda[i,form2,:].T)) for (form1,form2) = k_form_pairs[n]
+        # or det(dot(d_lambda[i,form1,:],dot(tensors[i],d_lambda[i,form2,:].T))) with tensor coefficients
+        A = d_lambda[:,k_form_pairs_array[:,0]]
+        B = d_lambda[:,k_form_pairs_array[:,1]].swapaxes(-1,-2)
+        if tensors is not None:
+            B = numpy.matmul(tensors[:,None], B)
+        gram = numpy.matmul(A, B)
+        if k == 1:
+            dets = gram[:,:,0,0]
+        else:
+            dets = stacked_det(gram)
+    else:
+        # for k=0, all determinants are 1
+        dets = ones((len(scales),dets_to_vals.shape[1]))
+
+    out[:] = (dets_to_vals * dets.T).T
+    out *= scales.reshape((-1,1))
+
+
+def _whitney_worker(specs,p,k,start,stop):
+    ## compute the local mass matrices of simplices start:stop in a 
+    ## worker process
+    with _attached_arrays(specs) as arrays:
+        vertices,simplices,scales,data = arrays[:4]
+        if len(arrays) > 4:
+            tensors = arrays[4][start:stop]
+        else:
+            tensors = None
+        data = data.reshape((len(simplices),-1))
+        if k > 0:
+            d_lambda = barycentric_gradients_array(vertices[simplices[start:stop]])
+        else:
+            d_lambda = None
+        _whitney_values(p, k, d_lambda, scales[start:stop], data[start:stop], tensors)
+        del arrays,vertices,simplices,scales,data,tensors
+
+
+@contextmanager
+def _shared_arrays(arrays):
+    ## copy arrays into shared memory blocks, which are released on exit.
+    ## Entries given as (shape,dtype) tuples are allocated uninitialized
+    blocks,specs,shared = [],[],[]
+    try:
+        for A in arrays:
+            if isinstance(A, tuple):
+                shape,dtype = A
+                A,dtype = None,numpy.dtype(dtype)
+            else:
+                A = asarray(A)
+                shape,dtype = A.shape,A.dtype
+            nbytes = int(numpy.prod(shape)) * dtype.itemsize
+            blocks.append(shared_memory.SharedMemory(create=True, size=max(nbytes,1)))
+            specs.append((blocks[-1].name, shape, dtype))
+            shared.append(numpy.ndarray(shape, dtype=dtype, buffer=blocks[-1].buf))
+            if A is not None:
+                shared[-1][...] = A
+        yield specs,shared
+    finally:
+        del shared
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+@contextmanager
+def _attached_arrays(specs):
+    ## arrays in the shared memory blocks created by _shared_arrays
+    blocks = [shared_memory.SharedMemory(name=name) for name,shape,dtype in specs]
+    try:
+        yield [numpy.ndarray(shape, dtype=dtype, buffer=block.buf)
+               for block,(name,shape,dtype) in zip(blocks,specs)]
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def _parallel_chunks(worker,specs,chunks,workers,*args):
+    ## call worker(specs,*args,start,stop) for every chunk in a process pool
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(worker, specs, *(args + chunk)) for chunk in chunks]
+        for future in futures:
+            future.result()
+
+
+
+def whitney_innerproduct(complex,k,out=None,workers=None,matrix_free=False,coefficients=None):
+    """
+    For a given SimplicialComplex, compute a matrix representing the 
+    innerproduct of Whitney k-forms
 
-    #maps flat vector of determinants to the flattened matrix entries
-    dets_to_vals = scipy.sparse.lil_matrix((num_k_face_pairs,num_k_form_pairs))
+    The innerproduct may be weighted by coefficients on the top
+    simplices, either an array of N scalars or an (N,D,D) array of 
+    symmetric positive definite tensors, where N is the number of top
+    simplices and D the embedding dimension.  A single scalar or 
+    (D,D) tensor applies to all simplices.  With tensor coefficients
+    T, the product of the k-forms d(lambda_I) and d(lambda_J) on a 
+    simplex is det(d(lambda_I) T d(lambda_J)^T), so the tensor c*I 
+    scales k-forms by c**k and tensors do not affect 0-forms.  Since
+    the pattern is reused, changing the coefficients (with out=) only
+    recomputes the values.
+
+    The sparsity pattern of the matrix is computed once per complex
+    (see massmatrix_pattern), so subsequent calls only compute the
+    numerical values.  When out is a matrix previously returned by
+    this function, for instance before the vertices of the complex
+    were moved, its data array is overwritten with the new values.
+
+    When workers is greater than 1, the local matrices of chunks of
+    simplices are computed in a pool of that many processes, which
+    read the mesh from and write their values to shared memory.  The
+    result is bitwise identical to serial assembly.
+
+    When matrix_free is True, the matrix is not assembled and a
+    whitney_mass_operator is returned instead.
+    """
+    assert(k >= 0 and k <= complex.complex_dimension())    
 
-    k_face_pairs = []
-    for face1 in k_faces:
-        for face2 in k_faces:
-            row_index = len(k_face_pairs)
+    if matrix_free:
+        return whitney_mass_operator(complex,k,coefficients=coefficients)
 
-            k_face_pairs.append((face1,face2))
+    indptr,indices,scatter = complex[k].whitney_pattern
+    _check_pattern(complex,k,out)
 
-            for n in range(k+1):
-               for m in range(k+1):
-                   form1 = face1[:n] + face1[n+1:]
-                   form2 = face2[:m] + face2[m+1:]
+    ## MASS MATRIX LOCAL DATA
+    p = complex.complex_dimension()
+    num_simplices = complex[-1].num_simplices
 
-                   col_index = k_form_pairs_to_index[(form1,form2)]
+    chunks = _whitney_chunks(num_simplices)
 
-                   dets_to_vals[row_index,col_index] += (-1)**(n+m)*((face1[n] == face2[m]) + 1)                 
+    scales,tensors = _whitney_weights(complex,k,coefficients)
+
+    if workers is None or workers <= 1 or len(chunks) <= 1:
+        data = _local_mass_matrices(complex,k,0,num_simplices,scales,tensors)
+        values = bincount(scatter, weights=data.reshape(-1), minlength=len(indices))
+    else:
+        arrays = [complex.vertices, complex[-1].simplices, scales,
+                  (scatter.shape,float)]
+        if tensors is not None:
+            arrays.append(tensors)
+
+        with _shared_arrays(arrays) as (specs,shared):
+            _parallel_chunks(_whitney_worker, specs, chunks, workers, p, k)
+            values = bincount(scatter, weights=shared[3], minlength=len(indices))
+            del shared
+
+    return _pattern_matrix(complex,k,values,out)
+
+
+def whitney_stiffness(complex,k,out=None,coefficients=None):
+    """
+    For a given SimplicialComplex, compute the stiffness matrix 
+    d^T M d of Whitney k-forms, where M is the Whitney (k+1)-form
+    innerproduct and d is the exterior derivative of k-forms
+
+    Rather than forming sparse products, the local matrix D^T M_e D
+    of each top simplex, where D is the local exterior derivative and
+    M_e the local (k+1)-form mass matrix, is summed into the sparsity
+    pattern of the k-form mass matrix.  Both matrices therefore share
+    one pattern, as is convenient for generalized eigenproblems.  As 
+    in whitney_innerproduct, the data of out is overwritten when out
+    is given, and the coefficients weight the (k+1)-form innerproduct.
+
+    Examples
+    --------
+    >>> from pydec import simplicial_complex
+    >>> sc = simplicial_complex(([[0,0],[1,0],[0,1]],[[0,1,2]]))
+    >>> K = whitney_stiffness(sc,0)
+    >>> K.todense()
+    matrix([[ 1. , -0.5, -0.5],
+            [-0.5,  0.5,  0. ],
+            [-0.5,  0. ,  0.5]])
+
+    """
+    p = complex.complex_dimension()
 
-    k_face_pairs_to_index = dict(zip(k_face_pairs,range(num_k_faces**2)))
-    dets_to_vals = dets_to_vals.tocsr()
-    ## END PRECOMPUTATION
+    assert(k >= 0 and k < p)
+
+    indptr,indices,scatter = complex[k].whitney_pattern
+    _check_pattern(complex,k,out)
+
+    num_simplices = complex[-1].num_simplices
+
+    D = _local_derivative(p,k)
+
+    scales,tensors = _whitney_weights(complex,k+1,coefficients)
+
+    data = empty(scatter.shape).reshape((num_simplices,-1))
+    for start,stop in _whitney_chunks(num_simplices):
+        #local (k+1)-form mass matrices
+        M = _local_mass_matrices(complex,k+1,start,stop,scales,tensors)
+
+        data[start:stop] = numpy.matmul(numpy.matmul(D.T, M), D).reshape((stop - start,-1))
+
+    values = bincount(scatter, weights=data.reshape(-1), minlength=len(indices))
+
+    return _pattern_matrix(complex,k,values,out)
+
+
+def whitney_lumped_innerproduct(complex,k,method='rowsum'):
+    """
+    For a given SimplicialComplex, compute a diagonal approximation
+    of the innerproduct of Whitney k-forms
+
+    The diagonal is returned as an array with one entry per k-simplex,
+    so that applying the inverse of the lumped mass matrix is a
+    pointwise division.  Unlike the circumcentric Hodge star, all 
+    methods give positive diagonals on meshes which are not 
+    well-centered.
+
+    Parameters
+    ----------
+    complex : simplicial_complex
+        Complex on which the Whitney forms are defined
+    k : integer
+        Degree of the Whitney forms
+    method : string
+        'rowsum' 
+            Sum of the absolute values of each row of the Whitney mass
+            matrix.  For k=0 this is the usual row-sum lumping, which 
+            preserves the total mass.  For k > 0 the absolute values 
+            make it independent of the orientation of the k-simplices,
+            at the cost of overestimating the mass.
+        'barycentric'
+            Diagonal Hodge star of the barycentric subdivision, 
+            (k+1)/(p+1) * sum(|T|)/|s|^2 for each k-simplex s, where
+            the sum is over the top simplices T which contain s.
+        'optimized'
+            On each top simplex, the diagonal which best reproduces 
+            the exact innerproduct of constant k-forms.  Entries are
+            bounded below by the diagonal of the local mass matrix and
+            rescaled to preserve the average energy of constant forms,
+            as the barycentric diagonal does.  This equals the circumcentric 
+            Hodge star of 1-forms on well-centered triangle meshes.
+
+    Examples
+    --------
+    >>> from pydec import simplicial_complex
+    >>> sc = simplicial_complex(([[0,0],[1,0],[0,1]],[[0,1,2]]))
+    >>> whitney_lumped_innerproduct(sc,0)
+    array([ 0.16666667,  0.16666667,  0.16666667])
+
+    """
+    p = complex.complex_dimension()
 
+    assert(k >= 0 and k <= p)
+
+    num_simplices = complex[-1].num_simplices
+    faces = _local_face_indices(complex,k)
+
+    if method == 'barycentric':
+        volumes = absolute(complex[-1].primal_volume).repeat(faces.shape[1])
+        volumes = bincount(faces.reshape(-1), weights=volumes,
+                           minlength=complex[k].num_simplices)
+        return (k + 1) / float(p + 1) * volumes / complex[k].primal_volume**2
+
+    elif method in ['rowsum','optimized']:
+        local_diagonals = empty(faces.shape)
+
+        if method == 'optimized':
+            C,P = _lumping_tables(p,k)
+            rows,cols = numpy.triu_indices(C.shape[1])
+
+        scales = _whitney_scales(complex,k)
+
+        for start,stop in _whitney_chunks(num_simplices):
+            M = _local_mass_matrices(complex,k,start,stop,scales)
+
+            if method == 'rowsum':
+                local_diagonals[start:stop] = absolute(M).sum(axis=2)
+            else:
+                # innerproducts of the constant k-forms, reproduced exactly by M
+                G = numpy.matmul(numpy.matmul(C.T, M), C)
+                D = numpy.matmul(G[:,rows,cols], P.T)
+
+                # bound below by the diagonal of M, then rescale so that 
+                # trace(C^T D C G^-1) = trace(I), the energy of constant forms
+                D = numpy.maximum(D, numpy.diagonal(M, axis1=1, axis2=2))
+                weights = (C.T * numpy.linalg.solve(G, numpy.broadcast_to(C.T, G.shape[:2] + C.T.shape[1:]))).sum(axis=1)
+                D *= (C.shape[1] / (D * weights).sum(axis=1)).reshape((-1,1))
+
+                local_diagonals[start:stop] = D
+
+        return bincount(faces.reshape(-1), weights=local_diagonals.reshape(-1),
+                        minlength=complex[k].num_simplices)
 
-    ## COMPUTATION
-    if k == 1:
-        Fdet = lambda x : x #det for 1x1 matrices - extend
     else:
-        # scipy.linalg.flinalg was removed in SciPy 1.13.1
-        #Fdet, = scipy.linalg.flinalg.get_flinalg_funcs(('det',),(complex.vertices,))
-        Fdet = scipy.linalg.det
+        raise ValueError('unknown method (%s)' % method)
+
+
+@lru_cache(maxsize=None)
+def _lumping_tables(p,k):
+    """
+    Tables for the optimized diagonal mass matrix of a p-simplex
 
+    Returns read-only arrays C and P, where C[i,J] is (up to a factor
+    of k!) the integral over the i-th local k-face of the constant 
+    k-form d(lambda_J), for every k-subset J of the vertices 1..p.  P 
+    is the pseudoinverse of the map from a diagonal D to the upper 
+    triangle of C^T D C.
+    """
+    k_faces = _whitney_tables(p,k)[0]
+    forms   = [tuple(x) for x in combinations(range(1,p+1),k)]
+
+    C = empty((len(k_faces),len(forms)))
+    for i,face in enumerate(k_faces):
+        for n,form in enumerate(forms):
+            # d(lambda_j) applied to the edge from face[0] to face[b]
+            A = [[int(j == face[b]) - int(j == face[0]) for b in range(1,k+1)] for j in form]
+            C[i,n] = numpy.linalg.det(array(A,dtype=float).reshape((k,k)))
 
+    rows,cols = numpy.triu_indices(len(forms))
+    P = numpy.linalg.pinv(C[:,rows] * C[:,cols]).T
 
-    dets = ones(num_k_form_pairs)
+    C.setflags(write=False)
+    P.setflags(write=False)
 
+    return C,P
 
-    for i,s in enumerate(complex[-1].simplices):
 
-        # for k=1, dets is already correct i.e. dets[:] = 1
-        if k > 0:  
-            # lambda_i denotes the scalar barycentric basis function of the i-th vertex of this simplex
-            # d(lambda_i) is the 1 form (gradient) of the i-th scalar basis function within this simplex
-            pts      = complex.vertices[s,:]
-            d_lambda = barycentric_gradients(pts)
-            
-            mtxs = d_lambda[k_form_pairs_array]     # these lines are equivalent to:
-            for n,(A,B) in enumerate(mtxs):         #   for n,(form1,form2) in enumerate(k_form_pairs):
-                #dets[n] = Fdet(inner(A,B))[0]      #       dets[n] = det(dot(d_lambda[form1,:],d_lambda[form2,:].T))
-                dets[n] = Fdet(inner(A,B))          #       dets[n] = det(dot(d_lambda[form1,:],d_lambda[form2,:].T))
-                
-        volume = complex[-1].primal_volume[i]
-        vals = dets_to_vals * dets
-        vals *= volume * scale_integration  #scale by the volume, barycentric weights, and account for the p! in each whitney form
+def _check_pattern(complex,k,out):
+    ## raise an error if out is not a matrix on the Whitney k-form pattern
+    if out is None:
+        return
 
-        #put values into appropriate entries of the COO data array
-        data[i*num_k_face_pairs:(i+1)*num_k_face_pairs] = vals
+    num_rows = complex[k].num_simplices
+    indptr,indices,scatter = complex[k].whitney_pattern
 
+    if out.shape != (num_rows,num_rows) or not isspmatrix_csr(out) or \
+            not array_equal(out.indptr,indptr) or not array_equal(out.indices,indices):
+        raise ValueError('out does not have the sparsity pattern of the mass matrix')
 
-    #now rows,cols,data form a COOrdinate representation for the mass matrix
-    shape = (complex[k].num_simplices,complex[k].num_simplices)  
-    return coo_matrix((data,(rows,cols)), shape).tocsr()
 
+def _pattern_matrix(complex,k,values,out):
+    ## CSR matrix with the given values on the Whitney k-form pattern
+    if out is not None:
+        out.data[:] = values
+        return out
 
+    num_rows = complex[k].num_simplices
+    indptr,indices,scatter = complex[k].whitney_pattern
 
+    shape = (num_rows,num_rows)
+    return csr_matrix((values,indices.copy(),indptr.copy()), shape)
 
-def regular_cube_innerproduct(rcc,k):      
+
+class whitney_mass_operator(LinearOperator):
+    """
+    Matrix-free Whitney k-form mass matrix
+
+    The product M*x is computed element by element: the values of x
+    on the local k-faces of each top simplex are gathered, multiplied
+    by the dense local mass matrices, and summed into the result.  
+
+    Parameters
+    ----------
+    complex : simplicial_complex
+        Complex on which the Whitney forms are defined
+    k : integer
+        Degree of the Whitney forms
+    store_local : bool
+        If True, the local mass matrices are computed once and stored.
+        Otherwise they are recomputed from the cached barycentric
+        gradients of the complex at every product, which uses less 
+        memory and follows changes made with update_vertices.
+    coefficients : array or None
+        Scalar or tensor coefficients on the top simplices, as in
+        whitney_innerproduct
+
+    Examples
+    --------
+    >>> from pydec import simplicial_complex
+    >>> sc = simplicial_complex(([[0,0],[1,0],[0,1]],[[0,1,2]]))
+    >>> M = whitney_mass_operator(sc,0)
+    >>> M * [1,1,1]
+    array([ 0.16666667,  0.16666667,  0.16666667])
+
+    """
+    def __init__(self, complex, k, store_local=True, coefficients=None):
+        assert(k >= 0 and k <= complex.complex_dimension())
+
+        N = complex[k].num_simplices
+        super(whitney_mass_operator,self).__init__(dtype=numpy.dtype(float), shape=(N,N))
+
+        self.complex      = complex
+        self.k            = k
+        self.coefficients = coefficients
+        self.faces        = _local_face_indices(complex,k)
+
+        if store_local:
+            self.local = self.local_matrices()
+        else:
+            self.local = None
+
+    def local_matrices(self, start=0, stop=None):
+        """Local mass matrices of the top simplices start:stop
+
+        Returns an array with shape (stop - start, F, F), where F is the
+        number of k-faces of each top simplex.
+        """
+        if stop is None:
+            stop = self.complex[-1].num_simplices
+
+        scales,tensors = _whitney_weights(self.complex,self.k,self.coefficients)
+        return _local_mass_matrices(self.complex,self.k,start,stop,scales,tensors)
+
+    def _matvec(self, x):
+        x = asarray(x).reshape(-1)
+
+        if numpy.iscomplexobj(x):
+            return self._matvec(x.real) + 1j*self._matvec(x.imag)
+
+        # gather, multiply by the local matrices, and scatter
+        X = x[self.faces]
+        Y = empty(X.shape, dtype=float)
+
+        if self.local is None:
+            scales,tensors = _whitney_weights(self.complex,self.k,self.coefficients)
+
+        for start,stop in _whitney_chunks(len(X)):
+            if self.local is None:
+                local = _local_mass_matrices(self.complex,self.k,start,stop,scales,tensors)
+            else:
+                local = self.local[start:stop]
+            Y[start:stop] = numpy.matmul(local, X[start:stop,:,None])[:,:,0]
+
+        return bincount(self.faces.reshape(-1), weights=Y.reshape(-1), minlength=self.shape[0])
+
+    def _rmatvec(self, x):
+        # the mass matrix is symmetric
+        return self._matvec(x)
+
+    def _adjoint(self):
+        return self
+
+
+
+
+
+@lru_cache(maxsize=None)
+def _cube_tables(N,k):
+    """
+    Local k-faces of the standard N-cube [0,0,..,0] [0,1,...,N]
+
+    Returns read-only arrays with the local k-faces, one per row, and
+    a boolean mask whose entry [i,n] is True when the i-th face extends
+    along axis n.
+    """
+    #standard cube is [0,0,..,0] [0,1,...,N]   
+    standard_cube  = atleast_2d(array([0]*N + list(range(N)),dtype='i'))
+    standard_k_faces = standard_cube
+    for i in range(N,k,-1):        
+        standard_k_faces = cube_array_boundary(standard_k_faces,i)[0]
+
+    mask = zeros((standard_k_faces.shape[0],N),dtype=bool)
+    for n in range(k):
+        mask[arange(len(mask)),standard_k_faces[:,N+n]] = True
+
+    standard_k_faces.setflags(write=False)
+    mask.setflags(write=False)
+
+    return standard_k_faces,mask
+
+
+def _cube_local_matrix(N,k,h):
+    ## local k-form innerproduct of a cube with side lengths h
+    standard_k_faces,mask = _cube_tables(N,k)
+
+    origins    = standard_k_faces[:,:N]
+    directions = standard_k_faces[:,N:]
+
+    #cube volume, and each k-form scales with the inverse lengths of its sides
+    V = numpy.prod(h)
+    scales = V * (1/3.0)**(N-k) / numpy.prod(numpy.where(mask, h**2, 1), axis=1)
+
+    #faces with the same directions interact, and the entry is halved for 
+    #each other axis along which their origins differ
+    same = (directions[:,None,:] == directions[None,:,:]).all(axis=2)
+    differences = (origins[:,None,:] != origins[None,:,:]) & ~mask[:,None,:]
+
+    return numpy.where(same, scales.reshape((-1,1)) * 0.5**differences.sum(axis=2), 0)
+
+
+def _cube_rowcols(CA,standard_k_faces,keys,order,base,I,J,start,stop,rows,cols):
+    ## COO rows and columns of the nonzero local entries I,J of the cubes 
+    ## start:stop, located among the k-faces of the complex by their keys
+    N = CA.shape[1]
+    k_faces_per_cube = standard_k_faces.shape[0]
+    
+    k_faces = empty((stop - start,) + standard_k_faces.shape, dtype=CA.dtype)
+    k_faces[:] = standard_k_faces
+    k_faces[:,:,:N] += CA[start:stop].reshape((-1,1,N))
+
+    indices = keys.searchsorted(simplex_key(k_faces.reshape((-1,standard_k_faces.shape[1])), base))
+    if order is not None:
+        indices = order[indices]
+    indices = indices.reshape((-1,k_faces_per_cube))
+
+    rows[start*len(I):stop*len(I)] = indices[:,I].reshape(-1)
+    cols[start*len(J):stop*len(J)] = indices[:,J].reshape(-1)
+
+
+def _cube_worker(specs,base,start,stop):
+    ## compute the COO rows and columns of cubes start:stop in a worker process
+    with _attached_arrays(specs) as arrays:
+        CA,standard_k_faces,keys,I,J,rows,cols = arrays[:7]
+        if len(arrays) > 7:
+            order = arrays[7]
+        else:
+            order = None
+        _cube_rowcols(CA,standard_k_faces,keys,order,base,I,J,start,stop,rows,cols)
+        del arrays,CA,standard_k_faces,keys,I,J,rows,cols,order
+
+
+def regular_cube_innerproduct(rcc,k,h=1,workers=None):      
     """
     For a given regular_cube_complex, compute a matrix
     representing the k-form innerproduct.
@@ -175,56 +840,70 @@ def regular_cube_innerproduct(rcc,k):
     These elements are similar to Whitney forms,
     except using standard linear (bilinear,trilinear,..)
     elements for 0-forms.
+
+    The grid spacing h is either a scalar or a sequence with the side
+    length of the cubes along each axis.  Cubes are processed in chunks
+    of cube_chunk_size, and only the nonzero entries of the local 
+    matrices are stored, so memory is dominated by the COO 
+    representation of the result.  When workers is greater than 1, the 
+    chunks are processed in a pool of that many processes, which write 
+    their rows and columns to shared memory.
     """
 
     N = rcc.complex_dimension()
 
-    #standard cube is [0,0,..,0] [0,1,...,N]   
-    standard_cube  = atleast_2d(array([0]*N + range(N),dtype='i'))
-    standard_k_faces = standard_cube
-    for i in range(N,k,-1):        
-        standard_k_faces = cube_array_boundary(standard_k_faces,i)[0]
+    h = asarray(h,dtype=float) * ones(N)
+    if h.shape != (N,):
+        raise ValueError('expected grid spacing with shape (%d,)' % N)
 
-        
-    k_faces_per_cube = standard_k_faces.shape[0]
+    standard_k_faces = _cube_tables(N,k)[0]
 
+    K = _cube_local_matrix(N,k,h) #local stiffness matrix
 
-    K = zeros((k_faces_per_cube,k_faces_per_cube)) #local stiffness matrix
-    h = 1
-    V = h**N #cube volume
-    scale = V * (1/h)**2 * (1/3.0)**(N-k)
-    for i,row_i in enumerate(standard_k_faces):
-        for j,row_j in enumerate(standard_k_faces):
-            if all(row_i[N:] == row_j[N:]):
-                differences = (row_i[:N] != row_j[:N])
-                differences[row_i[N:]] = 0                
-                K[i,j] = scale * (1.0/2.0)**sum(differences)
-            else:
-                K[i,j] = 0
-        
+    #only the nonzero local entries are stored
+    I,J = K.nonzero()
+    values = K[I,J]
 
     CA = rcc[-1].cube_array[:,:N]
     num_cubes = CA.shape[0]
 
-    k_faces  = tile(hstack((CA,zeros((CA.shape[0],k),dtype=CA.dtype))),(1,k_faces_per_cube)).reshape((-1,N+k))
-    k_faces += tile(standard_k_faces,(num_cubes,1))
-    
+    #k-faces are located by their sorted keys
     k_face_array = rcc[k].cube_array
+    num_faces = len(k_face_array)
+    base = int(k_face_array.max()) + 1 if num_faces > 0 else 1
+    keys = simplex_key(k_face_array, base)
+    order = keys.argsort(kind='stable')
+    if (order == arange(num_faces)).all():
+        order = None
+    else:
+        keys = keys[order]
 
-    face_indices = cube_array_search(k_face_array,k_faces)
+    index_dtype = 'int32' if num_faces < 2**31 else 'int64'
 
-    rows = face_indices.repeat(k_faces_per_cube)
-    cols = face_indices.reshape((-1,k_faces_per_cube)).repeat(k_faces_per_cube,axis=0).reshape((-1,))
-    data = K.reshape((1,-1)).repeat(num_cubes,axis=0).reshape((-1,))
-    
-    # temporary memory cost solution - eliminate zeros from COO representation
-    nz_mask = data != 0.0
-    rows = rows[nz_mask]
-    cols = cols[nz_mask]
-    data = data[nz_mask]
-
-    shape = (len(k_face_array),len(k_face_array))
-    return coo_matrix( (data,(rows,cols)), shape).tocsr()
-    
-    
-  
+    chunks = [(start,min(start + cube_chunk_size, num_cubes))
+              for start in range(0, num_cubes, cube_chunk_size)]
+
+    data = tile(values, num_cubes)
+
+    shape = (num_faces,num_faces)
+
+    if workers is None or workers <= 1 or len(chunks) <= 1:
+        rows = empty(num_cubes*len(I), dtype=index_dtype)
+        cols = empty(num_cubes*len(J), dtype=index_dtype)
+        for start,stop in chunks:
+            _cube_rowcols(CA,standard_k_faces,keys,order,base,I,J,start,stop,rows,cols)
+        return coo_matrix( (data,(rows,cols)), shape).tocsr()
+
+    # rows and columns are written to shared memory by the workers and 
+    # converted before the shared memory is released
+    arrays = [CA, standard_k_faces, keys, I, J,
+              ((num_cubes*len(I),),index_dtype), ((num_cubes*len(J),),index_dtype)]
+    if order is not None:
+        arrays.append(order)
+
+    with _shared_arrays(arrays) as (specs,shared):
+        _parallel_chunks(_cube_worker, specs, chunks, workers, base)
+        A = coo_matrix( (data,(shared[5],shared[6])), shape).tocsr()
+        del shared
+
+    return A
@@ -9,7 +9,8 @@ from pydec.dec import simplicial_complex, regular_cube_complex
 from pydec.mesh import simplex, regular_cube_mesh
 from pydec.math.combinatorial import combinations
 from pydec.fem.innerproduct import whitney_innerproduct, barycentric_gradients, massmatrix_rowcols, \
-     regular_cube_innerproduct
+     regular_cube_innerproduct, barycentric_gradients_array, whitney_mass_operator, whitney_stiffness, \
+     whitney_lumped_innerproduct, _whitney_tables
     
 
 class TestGradients(TestCase):    
@@ -27,6 +28,21 @@ class TestGradients(TestCase):
     
         for pts,grads in cases:                        
             assert_almost_equal(grads,barycentric_gradients(pts))
+            assert_almost_equal(array([grads]),barycentric_gradients_array(array([pts])))
+
+    def test_complex(self):
+        # triangles embedded in 3D
+        v = array([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]])
+        s = array([[0,1,2],[0,1,3],[1,2,4]])
+        sc = simplicial_complex((v,s))
+
+        grads = sc[-1].barycentric_gradients
+        assert_equal(grads.shape,(3,3,3))
+        for pts,g in zip(v[sc[-1].simplices],grads):
+            assert_almost_equal(g,barycentric_gradients(pts))
+
+        sc.update_vertices(2*v)
+        assert_almost_equal(sc[-1].barycentric_gradients,grads/2)
 
 class TestMassmatrixRowCols(TestCase):    
     def test_simple(self):
@@ -57,6 +73,17 @@ class TestMassmatrixRowCols(TestCase):
         assert_equal(rows,array([0]))
         assert_equal(cols,array([0]))
 
+    def test_tables(self):
+        # local tables are shared by all complexes of the same dimension
+        for k in range(3):
+            assert(_whitney_tables(2,k) is _whitney_tables(2,k))
+
+        k_faces,face_pairs,k_form_pairs_array,dets_to_vals = _whitney_tables(2,1)
+        assert_equal(k_faces,array([[0,1],[0,2],[1,2]]))
+        assert_equal(face_pairs,array([[i,j] for i in range(3) for j in range(3)]))
+        assert_equal(dets_to_vals.shape,(9,6))
+        self.assertRaises(ValueError, k_faces.fill, 0)
+
 
     
 class test_whitney_innerproduct(TestCase):
@@ -181,6 +208,202 @@ class test_whitney_innerproduct(TestCase):
             self.assert_(min(real(eigvals(M))) >= 0)
             assert_almost_equal(M,M.T)
 
+    def test_chunks(self):
+        import pydec.fem.innerproduct as innerproduct
+
+        v = array([[0,0],[1,0],[2,0],[0,1],[1,1],[2,1.5]])
+        s = array([[0,1,4],[0,4,3],[1,2,5],[1,5,4]])
+        sc = simplicial_complex((v,s))
+
+        chunk_size = innerproduct.whitney_chunk_size
+        try:
+            for k in range(3):
+                expected = whitney_innerproduct(sc,k).todense()
+                innerproduct.whitney_chunk_size = 3
+                M = whitney_innerproduct(sc,k).todense()
+                innerproduct.whitney_chunk_size = chunk_size
+                assert_almost_equal(M,expected)
+        finally:
+            innerproduct.whitney_chunk_size = chunk_size
+
+    def test_out(self):
+        v = array([[0,0],[1,0],[2,0],[0,1],[1,1],[2,1.5]])
+        s = array([[0,1,4],[0,4,3],[1,2,5],[1,5,4]])
+        sc = simplicial_complex((v,s))
+
+        for k in range(3):
+            M = whitney_innerproduct(sc,k)
+            pattern = sc[k].whitney_pattern
+
+            sc.update_vertices(1.5*v)
+            expected = whitney_innerproduct(simplicial_complex((1.5*v,s)),k).todense()
+
+            data = M.data
+            assert(whitney_innerproduct(sc,k,out=M) is M)
+            assert(M.data is data)
+            assert(sc[k].whitney_pattern is pattern)
+            assert_almost_equal(M.todense(),expected)
+
+            sc.update_vertices(v)
+
+        self.assertRaises(ValueError, whitney_innerproduct, sc, 1, out=whitney_innerproduct(sc,0))
+
+    def test_matrix_free(self):
+        v = array([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]])
+        s = array([[0,1,2,3],[1,2,3,4]])
+        sc = simplicial_complex((v,s))
+
+        for k in range(4):
+            expected = whitney_innerproduct(sc,k).todense()
+            for M in [whitney_innerproduct(sc,k,matrix_free=True),
+                      whitney_mass_operator(sc,k,store_local=False)]:
+                assert_equal(M.shape,expected.shape)
+                assert_almost_equal(M * eye(M.shape[0]),expected)
+                assert_almost_equal(M.T * eye(M.shape[0]),expected)
+
+    def test_stiffness(self):
+        v = array([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]])
+        s = array([[0,1,2,3],[1,2,3,4]])
+        sc = simplicial_complex((v,s))
+
+        for k in range(3):
+            K = whitney_stiffness(sc,k)
+            M = whitney_innerproduct(sc,k)
+            expected = sc[k].d.T * whitney_innerproduct(sc,k+1) * sc[k].d
+            assert_almost_equal(K.todense(),expected.todense())
+            assert_equal(K.indptr,M.indptr)
+            assert_equal(K.indices,M.indices)
+
+            data = K.data
+            assert(whitney_stiffness(sc,k,out=K) is K)
+            assert(K.data is data)
+            assert_almost_equal(K.todense(),expected.todense())
+
+    def test_lumped(self):
+        # equilateral triangles
+        v = array([[0,0],[1,0],[0.5,sqrt(3)/2],[1.5,sqrt(3)/2],[-0.5,sqrt(3)/2]])
+        s = array([[0,1,2],[1,3,2],[0,2,4]])
+        sc = simplicial_complex((v,s))
+
+        for k in range(3):
+            M = whitney_innerproduct(sc,k)
+            for method in ['rowsum','barycentric','optimized']:
+                D = whitney_lumped_innerproduct(sc,k,method)
+                assert_equal(D.shape,(sc[k].num_simplices,))
+                assert(D.min() > 0)
+                if k == 0:
+                    assert_almost_equal(D,M.sum(axis=1).A.ravel())
+                if k == 2:
+                    assert_almost_equal(D,M.diagonal())
+
+        # reproduces the circumcentric Hodge star of 1-forms
+        assert_almost_equal(whitney_lumped_innerproduct(sc,1,'optimized'),sc[1].star_diag)
+        assert_almost_equal(whitney_lumped_innerproduct(sc,1,'rowsum'),
+                            abs(whitney_innerproduct(sc,1)).sum(axis=1).A.ravel())
+
+        # barycentric dual of the middle edge covers a third of each triangle
+        edge = sc[1].simplex_to_index[simplex((0,2))]
+        assert_almost_equal(whitney_lumped_innerproduct(sc,1,'barycentric')[edge],
+                            2.0/3.0 * 2 * sqrt(3)/4)
+
+        # obtuse triangle
+        sc = simplicial_complex((array([[0,0],[4,0],[2,0.5]]),array([[0,1,2]])))
+        for k in range(3):
+            assert(whitney_lumped_innerproduct(sc,k,'optimized').min() > 0)
+
+        self.assertRaises(ValueError, whitney_lumped_innerproduct, sc, 1, 'diagonal')
+
+    def test_orientation(self):
+        """Top simplices with reversed orientation give the same matrices"""
+        cases = []
+        #two line segments, the second one reversed
+        cases.append((array([[0],[1],[3]]),array([[0,1],[1,2]]),array([[0,1],[2,1]])))
+        #two triangles in a square, the second one reversed
+        cases.append((array([[0,0],[1,0],[1,1],[0,1]]),array([[0,1,2],[0,2,3]]),array([[0,1,2],[0,3,2]])))
+        #two tetrahedra sharing a face, the second one reversed
+        cases.append((array([[0,0,0],[1,0,0],[0,1,0],[0,0,1],[1,1,1]]),
+                      array([[0,1,2,3],[2,1,4,3]]),array([[0,1,2,3],[1,2,4,3]])))
+
+        for v,consistent,flipped in cases:
+            sc1 = simplicial_complex((v,consistent))
+            sc2 = simplicial_complex((v,flipped))
+            assert((sc1[-1].primal_volume > 0).all())
+            assert((sc2[-1].primal_volume < 0).any())
+
+            N = sc1.complex_dimension()
+            for k in range(N + 1):
+                M1 = whitney_innerproduct(sc1,k).todense()
+                M2 = whitney_innerproduct(sc2,k).todense()
+                assert_almost_equal(M1,M2)
+                assert(eigvals(M2).real.min() > 0)
+
+                assert_almost_equal(whitney_lumped_innerproduct(sc1,k,'barycentric'),
+                                    whitney_lumped_innerproduct(sc2,k,'barycentric'))
+
+    def test_coefficients(self):
+        v = array([[0,0],[1,0],[0,1],[1,1]])
+        s = array([[0,1,2],[1,3,2]])
+        sc = simplicial_complex((v,s))
+
+        c = array([2.0,3.0])
+        T = array([[[2.0,0.5],[0.5,1.0]],[[1.0,0.0],[0.0,4.0]]])
+
+        for k in range(3):
+            M = whitney_innerproduct(sc,k)
+            assert_almost_equal(whitney_innerproduct(sc,k,coefficients=2).todense(),2*M.todense())
+            assert_almost_equal(whitney_innerproduct(sc,k,coefficients=eye(2)).todense(),M.todense())
+
+            # weights each top simplex separately
+            expected = zeros(M.shape)
+            for i in range(2):
+                sub = simplicial_complex((v,s[i:i+1]))
+                rows = [sc[k].simplex_to_index[x] for x in sub[k].simplex_to_index]
+                cols = [sub[k].simplex_to_index[x] for x in sub[k].simplex_to_index]
+                expected[ix_(rows,rows)] += c[i] * whitney_innerproduct(sub,k).todense()[ix_(cols,cols)]
+            assert_almost_equal(whitney_innerproduct(sc,k,coefficients=c).todense(),expected)
+
+            K = whitney_innerproduct(sc,k,coefficients=T)
+            assert_almost_equal(K.todense(),K.T.todense())
+            assert(min(real(eigvals(K.todense()))) > 0)
+            assert_almost_equal((whitney_innerproduct(sc,k,coefficients=T,matrix_free=True) * eye(M.shape[0])),
+                                K.todense())
+            assert(whitney_innerproduct(sc,k,coefficients=c,out=K) is K)
+            assert_almost_equal(K.todense(),expected)
+
+        # 1-form innerproduct of a single triangle, integrated with the
+        # edge midpoint rule
+        sc = simplicial_complex((v[:3],s[:1]))
+        grads = barycentric_gradients(v[:3])
+        edges = [tuple(x) for x in sc[1].simplices]
+        expected = zeros((3,3))
+        for point in [[0.5,0.5,0],[0,0.5,0.5],[0.5,0,0.5]]:
+            W = [point[i]*grads[j] - point[j]*grads[i] for i,j in edges]
+            for a in range(3):
+                for b in range(3):
+                    expected[a,b] += dot(W[a],dot(T[0],W[b])) / 6.0
+        assert_almost_equal(whitney_innerproduct(sc,1,coefficients=T[0]).todense(),expected)
+
+        self.assertRaises(ValueError, whitney_innerproduct, sc, 1, coefficients=[1,2,3])
+
+    def test_workers(self):
+        import pydec.fem.innerproduct as innerproduct
+
+        v = array([[0,0],[1,0],[2,0],[0,1],[1,1],[2,1.5]])
+        s = array([[0,1,4],[0,4,3],[1,2,5],[1,5,4]])
+        sc = simplicial_complex((v,s))
+
+        chunk_size = innerproduct.whitney_chunk_size
+        try:
+            innerproduct.whitney_chunk_size = 3
+            for k in range(3):
+                expected = whitney_innerproduct(sc,k)
+                M = whitney_innerproduct(sc,k,workers=2)
+                assert_equal(M.indptr,expected.indptr)
+                assert_equal(M.indices,expected.indices)
+                assert_equal(M.data,expected.data)
+        finally:
+            innerproduct.whitney_chunk_size = chunk_size
+
 
 
 
@@ -197,6 +420,60 @@ class TestRegularCubeInnerproduct(TestCase):
         rcc = regular_cube_complex(rcm)
         K = regular_cube_innerproduct(rcc,k).todense()
         return K
+
+
+    def test_spacing(self):
+        rcc = regular_cube_complex(regular_cube_mesh(ones((1,),dtype='bool')))
+        assert_almost_equal(regular_cube_innerproduct(rcc,0,h=2).todense(),
+                            array([[2.0/3.0,1.0/3.0],[1.0/3.0,2.0/3.0]]))
+        assert_almost_equal(regular_cube_innerproduct(rcc,1,h=2).todense(),array([[0.5]]))
+
+        # x-edges are scaled by V/h_x**2, y-edges by V/h_y**2
+        rcc = regular_cube_complex(regular_cube_mesh(ones((1,1),dtype='bool')))
+        K = regular_cube_innerproduct(rcc,1,h=[1,2]).todense()
+        K_unit = regular_cube_innerproduct(rcc,1).todense()
+        x_edges = [i for i,e in enumerate(rcc[1].cube_array) if e[2] == 0]
+        y_edges = [i for i,e in enumerate(rcc[1].cube_array) if e[2] == 1]
+        assert_almost_equal(K[ix_(x_edges,x_edges)],2*K_unit[ix_(x_edges,x_edges)])
+        assert_almost_equal(K[ix_(y_edges,y_edges)],0.5*K_unit[ix_(y_edges,y_edges)])
+
+        assert_almost_equal(regular_cube_innerproduct(rcc,2,h=[1,2]).todense(),array([[0.5]]))
+
+        self.assertRaises(ValueError, regular_cube_innerproduct, rcc, 1, h=[1,2,3])
+
+    def test_chunks(self):
+        import pydec.fem.innerproduct as innerproduct
+
+        bitmap = array([[1,1,0],[1,1,1],[0,1,1]],dtype='bool')
+        rcc = regular_cube_complex(regular_cube_mesh(bitmap))
+
+        chunk_size = innerproduct.cube_chunk_size
+        try:
+            for k in range(3):
+                expected = regular_cube_innerproduct(rcc,k).todense()
+                innerproduct.cube_chunk_size = 2
+                K = regular_cube_innerproduct(rcc,k).todense()
+                innerproduct.cube_chunk_size = chunk_size
+                assert_equal(K,expected)
+        finally:
+            innerproduct.cube_chunk_size = chunk_size
+
+    def test_workers(self):
+        import pydec.fem.innerproduct as innerproduct
+
+        rcc = regular_cube_complex(regular_cube_mesh(ones((3,2),dtype='bool')))
+
+        chunk_size = innerproduct.cube_chunk_size
+        try:
+            innerproduct.cube_chunk_size = 2
+            for k in range(3):
+                expected = regular_cube_innerproduct(rcc,k)
+                K = regular_cube_innerproduct(rcc,k,workers=2)
+                assert_equal(K.indptr,expected.indptr)
+                assert_equal(K.indices,expected.indices)
+                assert_equal(K.data,expected.data)
+        finally:
+            innerproduct.cube_chunk_size = chunk_size
     
 
     def test_d1k0(self):
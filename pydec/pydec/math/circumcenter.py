@@ -1,7 +1,8 @@
-__all__ = ['is_wellcentered', 'circumcenter', 'circumcenter_barycentric']
+__all__ = ['is_wellcentered', 'circumcenter', 'circumcenter_barycentric',
+           'circumcenter_array', 'circumcenter_barycentric_array']
 
 from numpy import bmat, hstack, vstack, dot, sqrt, ones, zeros, sum, \
-        asarray
+        asarray, empty, matmul, einsum, ndim
 from numpy.linalg import solve,norm
 
 def is_wellcentered(pts, tol=1e-8):
@@ -101,6 +102,101 @@ def circumcenter(pts):
     center = dot(bary_coords,pts)
     radius = norm(pts[0,:] - center)
     return (center,radius)
+
+
+def circumcenter_barycentric_array(pts):
+    """Barycentric coordinates of the circumcenters of a stack of simplices.
+
+    Batched version of circumcenter_barycentric().  All the linear
+    systems are assembled at once and solved with a single stacked solve.
     
+    Parameters
+    ----------
+    pts : array-like
+        An M-by-N-by-K array where pts[i] contains the N points which 
+        define the i-th (N-1)-simplex in K dimensional space.
+        N and K must satisfy 1 <= N <= K + 1 and K >= 1.
+
+    Returns
+    -------
+    coords : ndarray
+        Barycentric coordinates of the circumcenters of the simplices.
+        Stored in an array with shape (M,N)
+        
+    Examples
+    --------
+    >>> from pydec.math.circumcenter import *
+    >>> circumcenter_barycentric_array([[[0,0],[4,0],[0,4]],[[0,0],[2,0],[1,1]]])
+    array([[ 0. ,  0.5,  0.5],
+           [ 0.5,  0.5,  0. ]])
+
+    See Also
+    --------
+    circumcenter_barycentric
+
+    """
+
+    pts = asarray(pts, dtype=float)
+
+    if ndim(pts) != 3:
+        raise ValueError('expected rank 3 array')
+
+    M,rows,cols = pts.shape
+
+    if rows > cols + 1:
+        raise ValueError('array has invalid shape')
+
+    # translate the first vertex to the origin to improve conditioning,
+    # barycentric coordinates are unaffected
+    pts = pts - pts[:,:1,:]
+    
+    A = zeros((M, rows + 1, rows + 1))
+    A[:,:-1,:-1] = 2*matmul(pts, pts.transpose(0,2,1))
+    A[:,:-1, -1] = 1
+    A[:, -1,:-1] = 1
+
+    b = empty((M, rows + 1, 1))
+    b[:,:-1,0] = sum(pts * pts, axis=2)
+    b[:, -1,0] = 1
+
+    x = solve(A,b)
+    bary_coords = x[:,:-1,0]
+    
+    return bary_coords
+
+
+def circumcenter_array(pts):
+    """Circumcenters and circumradii of a stack of simplices.
     
+    Batched version of circumcenter().
     
+    Parameters
+    ----------
+    pts : array-like
+        An M-by-N-by-K array where pts[i] contains the N points which 
+        define the i-th (N-1)-simplex in K dimensional space.
+        N and K must satisfy 1 <= N <= K + 1 and K >= 1.
+
+    Returns
+    -------
+    centers : ndarray
+        Circumcenters of the simplices.  Stored in an array with shape (M,K)
+    radii : ndarray
+        Circumradii of the simplices.  Stored in an array with shape (M,)
+        
+    Examples
+    --------
+    >>> circumcenter_array([[[0,0],[1,0]],[[0,0],[0,2]]])
+    (array([[ 0.5,  0. ],
+           [ 0. ,  1. ]]), array([ 0.5,  1. ]))
+
+    See Also
+    --------
+    circumcenter, circumcenter_barycentric_array
+
+    """
+    pts = asarray(pts, dtype=float)
+    bary_coords = circumcenter_barycentric_array(pts)
+    centers = einsum('ij,ijk->ik', bary_coords, pts)
+    radii = norm(pts[:,0,:] - centers, axis=1)
+    return (centers,radii)
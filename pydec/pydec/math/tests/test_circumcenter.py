@@ -2,7 +2,9 @@ from pydec.testing import *
 
 from scipy import random,rand,array,reshape,sqrt,sum,allclose
 
-from pydec.math.circumcenter import circumcenter,is_wellcentered
+from pydec.math.circumcenter import circumcenter, is_wellcentered, \
+        circumcenter_barycentric, circumcenter_array, \
+        circumcenter_barycentric_array
 
 class TestCircumcenter(TestCase):
     def setUp(self):	
@@ -37,5 +39,17 @@ class TestCircumcenter(TestCase):
                 (center,radius) = circumcenter(pts)           
                 distances = sqrt(sum((pts - center)**2,axis=1))
                 assert_almost_equal(max(distances),min(distances))
-                             
+
+    def test_array(self):
+        """batched circumcenters agree with the single simplex versions"""
+        for N in range(1,6):
+            for M in range(1,N+2):
+                pts = rand(7,M,N)
+                (centers,radii) = circumcenter_array(pts)
+                bary = circumcenter_barycentric_array(pts)
+                for i in range(pts.shape[0]):
+                    (center,radius) = circumcenter(pts[i])
+                    assert_almost_equal(centers[i],center)
+                    assert_almost_equal(radii[i],radius)
+                    assert_almost_equal(bary[i],circumcenter_barycentric(pts[i]))
 
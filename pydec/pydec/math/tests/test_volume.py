@@ -2,7 +2,8 @@ from pydec.testing import *
 
 from scipy import fabs, random, rand, array, sqrt
 
-from pydec.math.volume import unsigned_volume, signed_volume
+from pydec.math.volume import unsigned_volume, signed_volume, \
+        unsigned_volume_array, signed_volume_array
 
 
 def test_unsigned_volume():
@@ -38,4 +39,19 @@ def test_both():
     for N in range(1,10):
         pts = rand(N+1,N)
         assert_almost_equal(fabs(signed_volume(pts)), unsigned_volume(pts))
-      
+
+def test_arrays():
+    """batched volumes should agree with the single simplex versions"""
+
+    random.seed(0) #make tests repeatable                 
+    for N in range(1,6):
+        for M in range(0,N+1):
+            pts = rand(5,M+1,N)
+            volumes = unsigned_volume_array(pts)
+            for i in range(pts.shape[0]):
+                assert_almost_equal(volumes[i], unsigned_volume(pts[i]))
+
+        pts = rand(5,N+1,N)
+        volumes = signed_volume_array(pts)
+        for i in range(pts.shape[0]):
+            assert_almost_equal(volumes[i], signed_volume(pts[i]))
@@ -1,6 +1,8 @@
-__all__ = ['unsigned_volume','signed_volume']
+__all__ = ['unsigned_volume','signed_volume',
+           'unsigned_volume_array','signed_volume_array']
 
-from numpy import sqrt,inner,shape,asarray
+from numpy import sqrt,inner,shape,asarray,ones,matmul,ndim,absolute
+from numpy.linalg import det as stacked_det
 from scipy.special import factorial
 from scipy.linalg import det
 
@@ -107,3 +109,99 @@ def signed_volume(pts):
         
     A = pts[1:] - pts[0]
     return det(A)/factorial(M)
+
+
+def unsigned_volume_array(pts):
+    """Unsigned volumes of a stack of simplices
+    
+    Batched version of unsigned_volume().  Computes the unsigned volumes 
+    of K M-simplices embedded in N-dimensional space.  The Gram 
+    determinants of all the simplices are evaluated with a single
+    stacked determinant.
+    
+    Parameters
+    ----------
+    pts : array
+        Array with shape (K,M+1,N) where pts[i] contains the coordinates
+        of the (M+1) vertices of the i-th M-simplex.
+
+    Returns
+    -------
+    volumes : array
+        Array with shape (K,) of unsigned volumes
+
+    Notes
+    -----
+    Zero-dimensional simplices (points) are assigned unit volumes.
+
+    Examples
+    --------
+    >>> unsigned_volume_array( [[[0,0],[1,0]],[[0,0],[3,4]]] )
+    array([ 1.,  5.])
+
+    See Also
+    --------
+    unsigned_volume
+
+    """
+
+    pts = asarray(pts, dtype=float)
+
+    if ndim(pts) != 3:
+        raise ValueError('expected rank 3 array')
+
+    K,M,N = pts.shape
+    M -= 1
+
+    if M < 0 or M > N:
+        raise ValueError('array has invalid shape')
+
+    if M == 0:
+        return ones(K)
+
+    A = pts[:,1:] - pts[:,:1]
+    return sqrt(absolute(stacked_det(matmul(A, A.transpose(0,2,1)))))/factorial(M)
+
+
+def signed_volume_array(pts):
+    """Signed volumes of a stack of simplices
+    
+    Batched version of signed_volume().  Computes the signed volumes 
+    of K M-simplices embedded in M-dimensional space with a single
+    stacked determinant.
+    
+    Parameters
+    ----------
+    pts : array
+        Array with shape (K,M+1,M) where pts[i] contains the coordinates
+        of the (M+1) vertices of the i-th M-simplex.
+
+    Returns
+    -------
+    volumes : array
+        Array with shape (K,) of signed volumes
+
+    Examples
+    --------
+    >>> signed_volume_array( [[[0,0],[1,0],[0,1]],[[0,0],[0,1],[1,0]]] )
+    array([ 0.5, -0.5])
+
+    See Also
+    --------
+    signed_volume
+
+    """
+
+    pts = asarray(pts, dtype=float)
+
+    if ndim(pts) != 3:
+        raise ValueError('expected rank 3 array')
+
+    K,M,N = pts.shape
+    M -= 1
+
+    if M != N:
+        raise ValueError('array has invalid shape')
+
+    A = pts[:,1:] - pts[:,:1]
+    return stacked_det(A)/factorial(M)
@@ -1,6 +1,7 @@
 __all__ = ['Simplex','SimplicialMesh','simplex','simplicial_mesh']
 
 from pydec.math import signed_volume,relative_parity,combinations
+from pydec.dec.simplex_array import simplex_array_parity,simplex_array_boundary
 from .base_mesh import base_mesh
 
 
@@ -112,17 +113,17 @@ class simplicial_mesh(base_mesh):
         Return a set() of the boundary simplices, i.e. the faces 
         of the top level simplices that occur only once
         """
-        boundary_set = set()
-        
-        for row in self['elements']:
-            s = simplex(row)     
-            for b in s.boundary():
-                if b in boundary_set:
-                    boundary_set.remove(b) #b has occured twice
-                else:
-                    boundary_set.add(b)    #first occurance of b
-        
-        return boundary_set
+        s = self['elements'].copy()
+        parity = simplex_array_parity(s)
+        s.sort()
+
+        faces,B = simplex_array_boundary(s,parity)
+
+        # faces which occur only once, with their induced orientation
+        mask  = numpy.diff(B.indptr) == 1
+        signs = B.data[B.indptr[:-1][mask]]
+
+        return set(simplex(f, parity=int(sign < 0)) for f,sign in zip(faces[mask],signs))
     
     def skeleton(self,p):
         """
@@ -9,7 +9,7 @@ except ImportError:
 
 
 from numpy import asarray,zeros,empty,average
-from pydec import barycentric_gradients,combinations,Simplex
+from pydec import combinations
 import numpy
 
 
@@ -133,24 +133,22 @@ def simplex_quivers(sc,form):
     Sample a Whitney 1-form at simplex barycenters
     """
 
-    quiver_bases = average(sc.vertices[sc[-1].simplices],axis=1)
-    quiver_dirs  = zeros((sc[-1].num_simplices,sc.embedding_dimension()))
+    simplices = sc[-1].simplices
 
-    s_to_i = sc[1].simplex_to_index
+    quiver_bases = average(sc.vertices[simplices],axis=1)
+    quiver_dirs  = zeros((sc[-1].num_simplices,sc.embedding_dimension()))
 
-    for n,s in enumerate(sc[-1].simplices):
-        verts = sorted(s)
-        
-        d_lambda = barycentric_gradients(sc.vertices[verts,:])
-        edges   = [Simplex(x) for x in combinations(s,2)]
-        indices = [s_to_i[x] for x in edges]
-        values  = [form[i] for i in indices]
+    # local edges of each (sorted) top simplex and their indices in sc[1]
+    local_edges  = list(combinations(range(simplices.shape[1]),2))
+    edges        = simplices[:,numpy.array(local_edges)].reshape((-1,2))
+    edge_indices = sc[1].simplex_lookup(edges)[0].reshape((len(simplices),-1))
 
-        for e,v in zip(combinations(range(len(verts)),2),values):
-            quiver_dirs[n,:] += v*(d_lambda[e[1]] - d_lambda[e[0]])
+    d_lambda = sc[-1].barycentric_gradients
+    values   = asarray(form)[edge_indices]
 
+    for n,(i,j) in enumerate(local_edges):
+        quiver_dirs += values[:,n].reshape((-1,1)) * (d_lambda[:,j] - d_lambda[:,i])
 
-        
     quiver_dirs /= (sc.complex_dimension() + 1)
 
     return quiver_bases,quiver_dirs